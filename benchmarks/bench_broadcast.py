@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of pushing live tallies to many viewers
+
+Starts a TallyBroadcaster on localhost with a number of viewers reading the
+event stream, a few of them too slow to keep up, and publishes the tallies
+of a synthetic session the way a live session does while votes come in.
+Reports the time publish takes per event and per viewer, the events
+delivered to the fast viewers, how often the slow ones got a snapshot
+instead of their pending deltas, and checks that replaying the events of a
+viewer gives the final answers of every student
+
+Usage: python benchmarks/bench_broadcast.py [options], see --help
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+
+import synthetic
+
+
+async def viewer(port, stop, delay=0.0):
+    ''' Reads the event stream until stop is set, waiting delay seconds
+    after each event. Returns the answers replayed from the events and the
+    number of events read '''
+    connection=socket.socket()
+    if delay:
+        # Small buffer, so the slow reader holds back the server soon
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    connection.connect(('127.0.0.1', port))
+    connection.setblocking(False)
+    reader, writer=await asyncio.open_connection(sock=connection)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    answers={}
+    events=0
+    while True:
+        try:
+            event=await asyncio.wait_for(reader.readuntil(b'\n\n'), 0.5)
+        except asyncio.TimeoutError:
+            if stop.is_set():
+                break
+            continue
+        fields=dict(line.split(': ', 1) for line in
+                    event.decode().strip().split('\n'))
+        data=json.loads(fields['data'])
+        if fields['event']=='snapshot':
+            answers=dict(data['answers'])
+        else:
+            if data['new']:
+                answers={}
+            for studentid, letter in data['changes']:
+                if letter:
+                    answers[studentid]=letter
+                else:
+                    answers.pop(studentid, None)
+        events+=1
+        if delay:
+            await asyncio.sleep(delay)
+    writer.close()
+    return answers, events
+
+
+async def simulate(options, roster, blocks):
+    broadcaster=await realtimears.TallyBroadcaster(
+            roster.iclickerdict, queuesize=options.queue).start()
+    tallyindex=realtimears.TallyIndex(roster.iclickerdict)
+    stop=asyncio.Event()
+    viewers=[asyncio.create_task(viewer(broadcaster.port, stop,
+                                        0.05 if i<options.slow else 0.0))
+             for i in range(options.viewers)]
+    while len(broadcaster.viewers)<options.viewers:
+        await asyncio.sleep(0.01)
+    publishing=0.0
+    for number, (studentid, answerchoice, _) in enumerate(blocks):
+        # The votes of the question arrive in updates steps
+        for update in range(1, options.updates+1):
+            end=len(studentid)*update//options.updates
+            answers=tallyindex.tally([studentid[:end], answerchoice[:end]])
+            start=time.perf_counter()
+            broadcaster.publish(number+1, answers, None, {})
+            publishing+=time.perf_counter()-start
+            await asyncio.sleep(options.interval)
+    await asyncio.sleep(0.5)
+    stop.set()
+    results=await asyncio.gather(*viewers)
+    final=broadcaster.state()['answers']
+    broadcaster.close()
+    return publishing, broadcaster, results, final
+
+
+def main(arguments=None):
+    parser=argparse.ArgumentParser(description='Benchmark of pushing live '
+                                   'tallies to many viewers')
+    parser.add_argument('--viewers', type=int, default=50)
+    parser.add_argument('--slow', type=int, default=5,
+            help='viewers that take 50 ms to read each event')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--updates', type=int, default=20,
+            help='tallies published per question')
+    parser.add_argument('--interval', type=float, default=0.01,
+            help='seconds between tallies')
+    parser.add_argument('--queue', type=int, default=8,
+            help='events queued per viewer before coalescing')
+    parser.add_argument('--seed', type=int, default=1,
+            help='seed of the random generator, so runs use the same files')
+    options=parser.parse_args(arguments)
+    random.seed(options.seed)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        realtimears.parsecache.enabled=False
+        namecsvfile=os.path.join(tempdir, 'roster.csv')
+        sessionfile=os.path.join(tempdir, 'session.xml')
+        iclickerids=synthetic.makeRoster(namecsvfile, options.students)
+        synthetic.makeSession(sessionfile, iclickerids, options.questions,
+                              int(options.students*0.9), revotes=0.2)
+        roster=realtimears.loadRoster(namecsvfile)
+        blocks=realtimears.sessionBlocks(sessionfile)
+
+    publishing, broadcaster, results, final=asyncio.run(
+            simulate(options, roster, blocks))
+    fast=[events for _, events in results[options.slow:]]
+    slow=[events for _, events in results[:options.slow]]
+    mismatches=sum(1 for answers, _ in results if answers!=final)
+    print('viewers:', options.viewers, ' slow:', options.slow,
+          ' events published:', broadcaster.events)
+    print('publish per event:          %8.3f ms' %
+          (publishing*1000/broadcaster.events))
+    print('publish per event, viewer:  %8.2f us' %
+          (publishing*1e6/broadcaster.events/options.viewers))
+    if fast:
+        print('events read by fast viewers: %d-%d' % (min(fast), max(fast)))
+    if slow:
+        print('events read by slow viewers: %d-%d' % (min(slow), max(slow)))
+    print('coalesced into snapshots:  ', broadcaster.coalesced)
+    print('viewers with wrong answers:', mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__=='__main__':
+    sys.exit(main())
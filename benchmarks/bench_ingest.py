@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the network ingest of votes from several base stations
+
+Starts an IngestServer on localhost and a number of simulated Forwarders, one
+per base station, each sending the questions of a synthetic session the way
+forwardSession does while a poll is open: the votes received so far of the
+current question, again and again as more votes come in. Reports the messages
+and votes per second taken by the server, the round trip time of the messages
+and checks that the tally of the aggregator matches the tally of all the
+votes read as a single session
+
+Usage: python benchmarks/bench_ingest.py [options], see --help
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+from realtimears import ingest
+
+import synthetic
+
+
+async def station(name, port, blocks, updates, roundtrips):
+    ''' Sends each block of votes in updates growing pieces, keeping the
+    round trip time of every message '''
+    forwarder=ingest.Forwarder(name, '127.0.0.1', port)
+    for number, block in enumerate(blocks):
+        for update in range(1, updates+1):
+            end=len(block[0])*update//updates
+            start=time.perf_counter()
+            await forwarder.send(number+1, [column[:end] for column in block])
+            roundtrips.append(time.perf_counter()-start)
+    await forwarder.close()
+
+
+async def simulate(options, iclickerdict, stationblocks):
+    ''' Runs the server and one forwarder per station, returns the elapsed
+    seconds, the round trip times and the aggregator '''
+    aggregator=ingest.VoteAggregator(iclickerdict)
+    server=await ingest.IngestServer(aggregator).start()
+    roundtrips=[]
+    start=time.perf_counter()
+    await asyncio.gather(*[station('station %d' % i, server.port, blocks,
+                                   options.updates, roundtrips)
+                           for i, blocks in enumerate(stationblocks)])
+    elapsed=time.perf_counter()-start
+    server.close()
+    return elapsed, roundtrips, aggregator
+
+
+def main(arguments=None):
+    parser=argparse.ArgumentParser(description='Benchmark of the network '
+                                   'ingest of votes from several stations')
+    parser.add_argument('--stations', type=int, default=8)
+    parser.add_argument('--students', type=int, default=2000,
+            help='students in the roster, split among the stations')
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--updates', type=int, default=10,
+            help='messages per question and station while the poll is open')
+    parser.add_argument('--seed', type=int, default=1,
+            help='seed of the random generator, so runs use the same files')
+    options=parser.parse_args(arguments)
+    random.seed(options.seed)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        realtimears.parsecache.enabled=False
+        namecsvfile=os.path.join(tempdir, 'roster.csv')
+        iclickerids=synthetic.makeRoster(namecsvfile, options.students)
+        roster=realtimears.loadRoster(namecsvfile)
+        # Each station has its own share of the students, with a few
+        # unregistered clickers
+        stationblocks=[]
+        for i in range(options.stations):
+            sessionfile=os.path.join(tempdir, 'station%d.xml' % i)
+            share=iclickerids[i::options.stations]
+            synthetic.makeSession(sessionfile, share, options.questions,
+                                  int(len(share)*0.9), revotes=0.1,
+                                  nunregistered=2)
+            stationblocks.append(realtimears.sessionBlocks(sessionfile))
+
+    elapsed, roundtrips, aggregator=asyncio.run(
+            simulate(options, roster.iclickerdict, stationblocks))
+
+    # Same votes, with their times, read as one session with the stations in
+    # the order of their names
+    mismatches=0
+    tallyindex=realtimears.getTallyIndex(roster.iclickerdict)
+    order=sorted(range(options.stations), key=lambda i: 'station %d' % i)
+    for number in range(options.questions):
+        pollanswers=[[], [], []]
+        for i in order:
+            for column, values in zip(pollanswers, stationblocks[i][number]):
+                column.extend(values)
+        if tallyindex.tally(pollanswers)!=aggregator.tally(number+1)[1]:
+            mismatches+=1
+
+    messages=len(roundtrips)
+    votes=sum(len(block[0])*(options.updates+1)//2
+              for blocks in stationblocks for block in blocks)
+    roundtrips.sort()
+    print('stations:', options.stations, ' messages:', messages,
+          ' votes sent:', votes)
+    print('elapsed:        %8.2f s' % elapsed)
+    print('messages/s:     %8.0f' % (messages/elapsed))
+    print('votes/s:        %8.0f' % (votes/elapsed))
+    print('round trip p50: %8.2f ms' % (roundtrips[messages//2]*1000))
+    print('round trip p95: %8.2f ms' % (roundtrips[int(messages*0.95)]*1000))
+    print('tally mismatches:', mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the stages between a session file and its results
+
+Generates a synthetic roster and session file and times each stage of the
+pipeline: parse (full read of the session file, batch read, and incremental
+read of one appended question), tally (organizedResults of every question),
+timeline (the VoteTimeline of every question), render-data prep (the column
+changes the results window applies between questions), export (session
+csv file, write ahead log plus the csv file made from it, and packed
+archive) and packed read (tally of every question and history of one
+student from the packed archive). For each stage reports the best wall
+time, the votes processed per second and the peak memory allocated.
+
+Results can be saved as a baseline JSON file and later runs compared with
+it, a stage slower than the baseline by more than the tolerance is reported
+as a regression and makes the script exit with status 1. The files are
+generated from a fixed --seed, and a baseline made with other file options
+is refused (exit status 2), so both runs time the same files
+
+Usage: python benchmarks/bench_pipeline.py [options], see --help
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+from realtimears import export, session, tally
+
+import synthetic
+
+
+def measure(function, repeat):
+    ''' Best wall time in seconds of repeat calls to function, and the peak
+    memory in bytes allocated by one more call traced by tracemalloc '''
+    best=None
+    for _ in range(repeat):
+        start=time.perf_counter()
+        function()
+        elapsed=time.perf_counter()-start
+        if best is None or elapsed<best:
+            best=elapsed
+    tracemalloc.start()
+    function()
+    _, peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def runStages(options, tempdir):
+    ''' Generates the files and runs every stage, returns a dictionary of
+    stage name and [seconds, votes per second, peak bytes] '''
+    namecsvfile=os.path.join(tempdir, 'roster.csv')
+    sessionfile=os.path.join(tempdir, 'session.xml')
+    weights=[float(weight) for weight in options.weights.split(',')]
+    iclickerids=synthetic.makeRoster(namecsvfile, options.students,
+                                     options.duplicates)
+    synthetic.makeSession(sessionfile, iclickerids, options.questions,
+                          options.votes, weights, options.revotes,
+                          options.unregistered)
+    roster=realtimears.loadRoster(namecsvfile)
+    blocks=realtimears.sessionBlocks(sessionfile)
+    nvotes=sum(len(block[0]) for block in blocks)
+
+    def fullRead():
+        session.sessionreaders.clear()
+        realtimears.getPollResults(sessionfile)
+
+    def incrementalRead():
+        synthetic.appendQuestion(sessionfile, iclickerids, len(blocks)+1,
+                                 options.votes, weights, options.revotes)
+        realtimears.getPollResults(sessionfile)
+
+    def tallyAll():
+        for block in blocks:
+            realtimears.organizedResults(roster.iclickerdict, block)
+
+    def timelineAll():
+        realtimears.VoteTimeline(roster.iclickerdict).update(blocks)
+
+    organized=[realtimears.organizedResults(roster.iclickerdict, block)[1]
+               for block in blocks]
+
+    def renderPrep():
+        placement={}
+        for organizedresults in organized:
+            placement, _, _=tally.organizedChanges(placement,
+                                                   organizedresults)
+
+    questions=realtimears.batchSession(sessionfile, roster.iclickerdict)
+    cumresults=realtimears.sessionResults(roster.iclickerdict,
+                                          roster.studentlist, questions)
+    tallyindex=realtimears.getTallyIndex(roster.iclickerdict)
+
+    def exportCsv():
+        realtimears.makeSessionCsv(os.path.join(tempdir, 'session.csv'),
+                                   cumresults, roster.studentlist)
+
+    packedfile=os.path.join(tempdir, 'session.rtars')
+    realtimears.writePackedSession(packedfile, blocks)
+    packed=realtimears.PackedSession(packedfile)
+    someone=roster.clickersOf(roster.studentlist[len(roster.studentlist)//2])
+
+    def packedRead():
+        for number in range(len(packed)):
+            packed.tally(number+1, tallyindex)
+        packed.history(someone)
+
+    def exportLog():
+        logfile=os.path.join(tempdir, 'session.log')
+        if os.path.exists(logfile):
+            os.remove(logfile)
+        log=export.SessionLog(logfile, roster.studentlist)
+        for number, answers in enumerate(questions):
+            log.append(number+1, answers, tallyindex)
+        log.materialize(os.path.join(tempdir, 'fromlog.csv'))
+        log.close()
+
+    stages=[['parse full', fullRead, nvotes],
+            ['parse incremental', incrementalRead, options.votes],
+            ['tally', tallyAll, nvotes],
+            ['timeline', timelineAll, nvotes],
+            ['render prep', renderPrep, len(organized)*options.students],
+            ['export csv', exportCsv, nvotes],
+            ['export log', exportLog, nvotes],
+            ['export packed', lambda: realtimears.writePackedSession(
+                    packedfile, blocks), nvotes],
+            ['packed read', packedRead, nvotes]]
+    # The parse cache would hide the cost of parsing
+    realtimears.parsecache.enabled=False
+    stages.insert(1, ['parse batch', lambda: realtimears.batchSession(
+            sessionfile, roster.iclickerdict), nvotes])
+    results={}
+    for name, function, count in stages:
+        seconds, peak=measure(function, options.repeat)
+        results[name]=[seconds, count/seconds if seconds else 0, peak]
+    packed.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    ''' Prints the ratio of each stage to the baseline and returns the list
+    of stages slower than tolerance times the baseline '''
+    regressions=[]
+    for name, (seconds, _, _) in results.items():
+        if name not in baseline:
+            continue
+        ratio=seconds/baseline[name][0]
+        flag=''
+        if ratio>tolerance:
+            regressions.append(name)
+            flag='  REGRESSION'
+        print('%-18s %6.2fx baseline%s' % (name, ratio, flag))
+    return regressions
+
+
+def optionDifferences(options, stored):
+    ''' Dictionary of the options that shape the synthetic files and differ
+    from those stored in a baseline, with the value of this run and the
+    stored one. The number of repeats and the baseline files don't count '''
+    ignored={'repeat', 'save_baseline', 'baseline', 'tolerance'}
+    return {name: (value, stored.get(name)) for name, value in options.items()
+            if name not in ignored and stored.get(name)!=value}
+
+
+def main(arguments=None):
+    parser=argparse.ArgumentParser(description='Benchmark of the RealTime '
+                                   'ARS pipeline on synthetic files')
+    parser.add_argument('--students', type=int, default=400)
+    parser.add_argument('--duplicates', type=int, default=0,
+            help='roster rows that reuse an iClicker ID')
+    parser.add_argument('--questions', type=int, default=100,
+            help='<p> blocks in the session file')
+    parser.add_argument('--votes', type=int, default=350,
+            help='<v> votes per block')
+    parser.add_argument('--weights', default='4,3,2,1,1',
+            help='relative frequency of answers A-E')
+    parser.add_argument('--revotes', type=float, default=0.1,
+            help='fraction of clickers that vote twice in a question')
+    parser.add_argument('--unregistered', type=int, default=5,
+            help='clickers not in the roster that vote')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1,
+            help='seed of the random generator, so runs use the same files')
+    parser.add_argument('--save-baseline', metavar='FILE',
+            help='save the results as a baseline JSON file')
+    parser.add_argument('--baseline', metavar='FILE',
+            help='compare the results with a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+            help='slowdown over the baseline reported as regression')
+    options=parser.parse_args(arguments)
+    if options.baseline:
+        with open(options.baseline) as injson:
+            baseline=json.load(injson)
+        differences=optionDifferences(vars(options), baseline.get('options',
+                                                                  {}))
+        if differences:
+            print('The baseline was made with other options, run again '
+                  'with the same ones:')
+            for name, (value, stored) in sorted(differences.items()):
+                print('  --%s %s (this run %s)' % (name.replace('_', '-'),
+                                                   stored, value))
+            return 2
+
+    random.seed(options.seed)
+    with tempfile.TemporaryDirectory() as tempdir:
+        realtimears.parsecache.cachefile=os.path.join(tempdir, 'cache.sqlite')
+        results=runStages(options, tempdir)
+
+    print('%-18s %10s %14s %12s' % ('stage', 'ms', 'items/s', 'peak KiB'))
+    for name, (seconds, rate, peak) in results.items():
+        print('%-18s %10.2f %14.0f %12.1f' % (name, seconds*1000, rate,
+                                              peak/1024))
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as outjson:
+            json.dump({'options': vars(options), 'results': results}, outjson,
+                      indent=1)
+    if options.baseline:
+        if compare(results, baseline['results'], options.tolerance):
+            return 1
+    return 0
+
+
+if __name__=='__main__':
+    sys.exit(main())
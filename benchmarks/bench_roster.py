@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of loading and validating an iClicker roster
+
+Writes a csv file with the given number of students (a few of them sharing
+an iClicker ID), then times reading it into a Roster and validating the
+iClicker IDs of a session in which some clickers are not registered
+
+Usage: python benchmarks/bench_roster.py [options], see --help
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+
+import synthetic
+
+
+def bestOf(function, repeat=5):
+    ''' Best wall time in seconds of repeat calls to function '''
+    best=None
+    for _ in range(repeat):
+        start=time.perf_counter()
+        function()
+        elapsed=time.perf_counter()-start
+        if best is None or elapsed<best:
+            best=elapsed
+    return best
+
+
+def main(arguments=None):
+    parser=argparse.ArgumentParser(description='Benchmark of loading and '
+                                   'validating an iClicker roster')
+    parser.add_argument('students', type=int, nargs='?', default=5000,
+            help='students in the roster')
+    parser.add_argument('--seed', type=int, default=1,
+            help='seed of the random generator, so runs use the same files')
+    options=parser.parse_args(arguments)
+    random.seed(options.seed)
+    nstudents=options.students
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        namecsvfile=os.path.join(tempdir, 'roster.csv')
+        synthetic.makeRoster(namecsvfile, nstudents, nduplicates=10)
+        # Votes from every registered clicker plus 5% unregistered ones
+        iclickerids=['#%08X' % i for i in range(int(nstudents*1.05))]
+        random.shuffle(iclickerids)
+
+        parse=bestOf(lambda: realtimears.loadRoster(namecsvfile))
+        roster=realtimears.loadRoster(namecsvfile)
+        validate=bestOf(lambda: roster.validate(iclickerids))
+
+    print('students:', nstudents, ' duplicates:', len(roster.duplicates),
+          ' unregistered:', len(roster.validate(iclickerids)))
+    print('load csv:     %8.2f ms' % (parse*1000))
+    print('validate:     %8.2f ms' % (validate*1000))
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the semester database
+
+Fills a SemesterStore with the answers of a semester of synthetic sessions
+(random answer codes, so only the database is timed) and reports the time
+to ingest all of them, to ingest one more session into the full database,
+to skip a session that is already there, and to run each query: whole
+semester and one month participation, difficulty and distributions per
+question and per week. ingestSessionFile is also timed on a synthetic
+session file, reading it with the parse cache off, skipping it when it is
+unchanged and reading it again after it changed
+
+Usage: python benchmarks/bench_semester.py [options], see --help
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+
+import synthetic
+
+
+def sessionAnswers(nstudents, nquestions, participation):
+    ''' Answer codes of each question, each student answering with the
+    given probability '''
+    return [bytearray(random.randint(1, 5) if random.random()<participation
+                      else 0 for _ in range(nstudents))
+            for _ in range(nquestions)]
+
+
+def timeOf(function):
+    start=time.perf_counter()
+    function()
+    return time.perf_counter()-start
+
+
+def main(arguments=None):
+    parser=argparse.ArgumentParser(description='Benchmark of the semester '
+                                   'database')
+    parser.add_argument('--students', type=int, default=400)
+    parser.add_argument('--sessions', type=int, default=80)
+    parser.add_argument('--questions', type=int, default=6,
+            help='questions per session')
+    parser.add_argument('--seed', type=int, default=1,
+            help='seed of the random generator, so runs use the same files')
+    options=parser.parse_args(arguments)
+    random.seed(options.seed)
+
+    students=['Student %05d' % i for i in range(options.students)]
+    # Three sessions a week from the start of September
+    start=datetime.datetime(2016, 9, 5, 10, 30)
+    dates=[(start+datetime.timedelta(days=number//3*7+number%3*2))
+           .strftime('%Y-%m-%d %H:%M') for number in range(options.sessions)]
+    sessions=[sessionAnswers(options.students, options.questions,
+                             random.uniform(0.6, 0.95)) for _ in dates]
+    with tempfile.TemporaryDirectory() as tempdir:
+        store=realtimears.SemesterStore(os.path.join(tempdir, 'sem.sqlite'))
+
+        def ingestAll():
+            for number, (date, questions) in enumerate(zip(dates, sessions)):
+                store.ingest('S%03d' % number, date, questions, students,
+                             (number, 0))
+
+        timings=[['ingest all sessions', timeOf(ingestAll)]]
+        extra=sessionAnswers(options.students, options.questions, 0.8)
+        timings.append(['ingest one more', timeOf(lambda: store.ingest(
+                'extra', dates[-1], extra, students, (1, 0)))])
+        timings.append(['skip unchanged', timeOf(lambda: store.ingest(
+                'extra', dates[-1], extra, students, (1, 0)))])
+        timings.append(['replace changed', timeOf(lambda: store.ingest(
+                'extra', dates[-1], extra, students, (2, 0)))])
+        realtimears.parsecache.enabled=False
+        namecsvfile=os.path.join(tempdir, 'roster.csv')
+        iclickerids=synthetic.makeRoster(namecsvfile, options.students)
+        iclickerdict=realtimears.getiClickerData(namecsvfile)[1]
+        sessionfile=os.path.join(tempdir, 'L1612051030.xml')
+        synthetic.makeSession(sessionfile, iclickerids, options.questions,
+                              int(options.students*0.8), revotes=0.1)
+        timings.append(['ingest file', timeOf(
+                lambda: realtimears.ingestSessionFile(store, sessionfile,
+                                                      iclickerdict))])
+        timings.append(['skip unchanged file', timeOf(
+                lambda: realtimears.ingestSessionFile(store, sessionfile,
+                                                      iclickerdict))])
+        stat=os.stat(sessionfile)
+        os.utime(sessionfile, ns=(stat.st_atime_ns, stat.st_mtime_ns+1))
+        timings.append(['replace changed file', timeOf(
+                lambda: realtimears.ingestSessionFile(store, sessionfile,
+                                                      iclickerdict))])
+        month=dates[len(dates)//2][:7]
+        queries=[['participation', lambda: store.participation()],
+                 ['participation month', lambda: store.participation(
+                         month+'-01', month+'-31', 0.7)],
+                 ['difficulty', lambda: store.difficulty()],
+                 ['distribution', lambda: store.distributions()],
+                 ['distribution weekly', lambda: store.distributions(
+                         period='week')],
+                 ['history', lambda: store.history(students[7])]]
+        for name, query in queries:
+            timings.append([name, min(timeOf(query) for _ in range(5))])
+        size=os.path.getsize(os.path.join(tempdir, 'sem.sqlite'))
+
+    print('students:', options.students, ' sessions:', options.sessions,
+          ' questions:', options.sessions*options.questions,
+          ' database: %.0f KiB' % (size/1024))
+    for name, seconds in timings:
+        print('%-22s %10.2f ms' % (name, seconds*1000))
+
+
+if __name__=='__main__':
+    main()
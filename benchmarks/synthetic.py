@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic iClicker rosters and session files for the benchmarks
+
+makeRoster writes a csv file like the ones the script reads, with the student
+ID in the first column and the iClicker ID in the second column. makeSession
+writes a session XML file like the one the iClicker base saves, with one
+<p>...</p> block per question and one <v> element per vote. The files are
+drawn from the random module, the benchmarks seed it so every run makes the
+same files
+"""
+
+import random
+
+
+def makeRoster(namecsvfile, nstudents, nduplicates=0):
+    ''' Saves a csv file with nstudents rows of student ID and iClicker ID,
+    the last nduplicates rows reuse iClicker IDs of earlier rows. Returns the
+    list of registered iClicker IDs '''
+    iclickerids=[]
+    with open(namecsvfile, 'w') as outcsv:
+        for i in range(nstudents):
+            if i>=nstudents-nduplicates:
+                iclickerid='#%08X' % random.randrange(nstudents-nduplicates)
+            else:
+                iclickerid='#%08X' % i
+                iclickerids.append(iclickerid)
+            outcsv.write('Student %05d,%s\n' % (i, iclickerid))
+    return iclickerids
+
+
+def questionBlock(number, iclickerids, nvotes, weights, revotes):
+    ''' Text of one <p>...</p> block with votes from nvotes of iclickerids.
+    Answers A-E are picked with the relative weights given, and a fraction
+    revotes of the clickers vote a second time later in the poll '''
+    voters=random.sample(iclickerids, min(nvotes, len(iclickerids)))
+    votes=[]
+    for iclickerid in voters:
+        seconds=random.randint(2, 60)
+        votes.append((seconds, iclickerid))
+        if random.random()<revotes:
+            votes.append((random.randint(seconds, 90), iclickerid))
+    votes.sort()
+    lines=['<p idx="%d" strt="10:%02d:00" stp="10:%02d:30">'
+           % (number, number % 60, (number+1) % 60)]
+    for seconds, iclickerid in votes:
+        answer=random.choices('ABCDE', weights)[0]
+        lines.append('<v id="%s" ans="%s" tm="00:%02d:%02d" />'
+                     % (iclickerid, answer, seconds // 60, seconds % 60))
+    lines.append('</p>')
+    return '\n'.join(lines)+'\n'
+
+
+def makeSession(sessionfile, iclickerids, nquestions, nvotes,
+                weights=(1, 1, 1, 1, 1), revotes=0.0, nunregistered=0):
+    ''' Saves a session XML file with nquestions question blocks of about
+    nvotes votes each (plus the repeated votes of revotes). nunregistered
+    clickers that are not in iclickerids vote as well '''
+    voters=list(iclickerids)+['#F%07X' % i for i in range(nunregistered)]
+    with open(sessionfile, 'w') as outxml:
+        outxml.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        outxml.write('<ssn ssnn="Synthetic session">\n')
+        for number in range(nquestions):
+            outxml.write(questionBlock(number+1, voters, nvotes, weights,
+                                       revotes))
+        outxml.write('</ssn>\n')
+
+
+def appendQuestion(sessionfile, iclickerids, number, nvotes,
+                   weights=(1, 1, 1, 1, 1), revotes=0.0):
+    ''' Adds a question block to a session file the way the base does,
+    rewriting the closing tag of the root element '''
+    with open(sessionfile, 'r+b') as outxml:
+        # The closing tag is at the end, no need to read the whole file
+        outxml.seek(0, 2)
+        size=outxml.tell()
+        outxml.seek(max(0, size-64))
+        tail=outxml.read()
+        outxml.seek(size-len(tail)+tail.rindex(b'</ssn>'))
+        outxml.write(questionBlock(number, iclickerids, nvotes, weights,
+                                   revotes).encode())
+        outxml.write(b'</ssn>\n')
+        outxml.truncate()
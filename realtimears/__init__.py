@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+REAL TIME MONITORING OF AUDIENCE RESPONSE SYSTEM
+Gustavo A. Patino and Sarah Lerchenfeldt
+
+Headless core of RealTime ARS: reading of the iClicker files, tallying of
+the answers and saving of the results. It can be imported by scripts and
+tests without a display, the TKinter interface lives in realtimears.gui and
+is only imported when launched. The network servers load asyncio, which
+takes longer to import than the rest of the package, so their names are
+imported the first time they are used
+"""
+
+from importlib import import_module
+
+from .analytics import SemesterStore, ingestSessionFile, sessionDate
+from .archive import findSessionFiles, processArchive
+from .cache import ParseCache, cacheDirectory, parsecache
+from .export import (SessionLog, makeDistributionCsv, makeSessionCsv,
+                     makeTimelineCsv, readSessionLog, sessionLogFile,
+                     writeSessionMatrix)
+from .packed import (PackedSession, packSession, packedSessionFile,
+                     sessionHistory, writePackedSession)
+from .roster import Roster, getiClickerData, loadRoster
+from .session import SessionTailReader, getPollResults, sessionBlocks
+from .tally import (TallyIndex, batchSession, getTallyIndex,
+                    organizedResults, sessionResults, tallyLatest)
+from .timeline import QuestionTimeline, VoteTimeline, tallyTimeline
+
+
+# Names imported on first use, and the module each one comes from
+lazynames={'TallyBroadcaster': 'broadcast', 'Forwarder': 'ingest',
+           'IngestServer': 'ingest', 'VoteAggregator': 'ingest',
+           'forwardSession': 'ingest'}
+
+
+def __getattr__(name):
+    if name not in lazynames:
+        raise AttributeError('module ' + repr(__name__) +
+                             ' has no attribute ' + repr(name))
+    return getattr(import_module('.' + lazynames[name], __name__), name)
+
+
+def __dir__():
+    return sorted(list(globals())+list(lazynames))
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+Runs RealTime ARS with python -m realtimears
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
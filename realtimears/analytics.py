@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Semester database of processed sessions with participation, difficulty and
+answer distribution queries
+"""
+
+import contextlib
+import csv
+import os
+import re
+import sqlite3
+import time
+
+from .tally import (answercodes, answerletters, batchSession, columncodes,
+                    getTallyIndex)
+
+
+# iClicker names session files L followed by the date and time, yymmddHHMM
+sessionname=re.compile(r'L(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})')
+# strftime formats of the periods distributions can be grouped by
+periods={'session': None, 'day': '%Y-%m-%d', 'week': '%Y-W%W',
+         'month': '%Y-%m'}
+
+
+def sessionDate(sessionfile):
+    ''' Date and time of a session as YYYY-MM-DD HH:MM, from the name of the
+    file if iClicker named it, otherwise from its modification time '''
+    match=sessionname.search(os.path.basename(sessionfile))
+    if match:
+        return '20%s-%s-%s %s:%s' % match.groups()
+    return time.strftime('%Y-%m-%d %H:%M',
+                         time.localtime(os.path.getmtime(sessionfile)))
+
+
+class SemesterStore():
+    ''' SQLite database with the answers of every student to every question
+    of the sessions ingested so far. Besides the answers of each student in
+    each session (one byte per question, as TallyIndex answer codes) it keeps
+    aggregates that are updated as each session is ingested, so queries
+    never go back to the answers:
+        questions: the number of students that chose each option in each
+                   question
+        participation: questions answered by each student in each session
+        totals: questions answered and asked of each student over all
+                sessions
+    Ingesting a session that is already in the database with the same size
+    and modification time does nothing, a session file that changed replaces
+    its old rows and their part of the totals. Dates and participation are
+    indexed, so queries over a month read only the sessions of that month '''
+
+    def __init__(self, dbfile):
+        self.dbfile=dbfile
+        directory=os.path.dirname(os.path.abspath(dbfile))
+        os.makedirs(directory, exist_ok=True)
+        with contextlib.closing(self.connect()) as connection:
+            with connection:
+                connection.executescript('''
+                    CREATE TABLE IF NOT EXISTS sessions (
+                        id INTEGER PRIMARY KEY, name TEXT UNIQUE, date TEXT,
+                        size INTEGER, mtime INTEGER, nquestions INTEGER);
+                    CREATE INDEX IF NOT EXISTS sessiondates
+                        ON sessions (date);
+                    CREATE TABLE IF NOT EXISTS students (
+                        id INTEGER PRIMARY KEY, studentid TEXT UNIQUE);
+                    CREATE TABLE IF NOT EXISTS answers (
+                        session INTEGER, student INTEGER, codes BLOB,
+                        PRIMARY KEY (session, student));
+                    CREATE TABLE IF NOT EXISTS participation (
+                        session INTEGER, student INTEGER, answered INTEGER,
+                        PRIMARY KEY (session, student));
+                    CREATE INDEX IF NOT EXISTS participationstudents
+                        ON participation (student);
+                    CREATE TABLE IF NOT EXISTS totals (
+                        student INTEGER PRIMARY KEY, answered INTEGER,
+                        asked INTEGER);
+                    CREATE TABLE IF NOT EXISTS questions (
+                        session INTEGER, number INTEGER, a INTEGER,
+                        b INTEGER, c INTEGER, d INTEGER, e INTEGER,
+                        nochoice INTEGER, correct INTEGER,
+                        PRIMARY KEY (session, number));''')
+
+    def connect(self):
+        return sqlite3.connect(self.dbfile, timeout=10)
+
+    def ingest(self, name, date, questions, students, filekey=(None, None)):
+        ''' Add or replace a session: its name, date (YYYY-MM-DD HH:MM), a
+        list with the bytearray of answer codes of each question and the
+        students the codes belong to, in order (TallyIndex.students).
+        filekey is the size and modification time of the session file.
+        Returns False if the session was already there unchanged '''
+        with contextlib.closing(self.connect()) as connection:
+            with connection:
+                row=connection.execute('''SELECT id, size, mtime FROM sessions
+                    WHERE name=?''', (name,)).fetchone()
+                if row is not None:
+                    if filekey[0] is not None and tuple(row[1:])==filekey:
+                        return False
+                    self.remove(connection, row[0])
+                cursor=connection.execute('''INSERT INTO sessions
+                    (name, date, size, mtime, nquestions)
+                    VALUES (?, ?, ?, ?, ?)''',
+                    (name, date)+tuple(filekey)+(len(questions),))
+                session=cursor.lastrowid
+                connection.executemany('''INSERT OR IGNORE INTO students
+                    (studentid) VALUES (?)''',
+                    [(studentid,) for studentid in students])
+                ids=dict(connection.execute(
+                        'SELECT studentid, id FROM students'))
+                answerrows=[]
+                participationrows=[]
+                for index, studentid in enumerate(students):
+                    codes=bytes(answers[index] for answers in questions)
+                    answered=len(codes)-codes.count(0)
+                    answerrows.append((session, ids[studentid], codes))
+                    participationrows.append((session, ids[studentid],
+                                              answered))
+                connection.executemany('INSERT INTO answers VALUES (?, ?, ?)',
+                                       answerrows)
+                connection.executemany('''INSERT INTO participation
+                    VALUES (?, ?, ?)''', participationrows)
+                connection.executemany('''INSERT INTO totals VALUES (?, ?, ?)
+                    ON CONFLICT (student) DO UPDATE SET
+                    answered=answered+excluded.answered,
+                    asked=asked+excluded.asked''',
+                    [(student, answered, len(questions)) for
+                     _, student, answered in participationrows])
+                connection.executemany('''INSERT INTO questions
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)''',
+                    [(session, number+1)+tuple(answers.count(code)
+                                               for code in columncodes)
+                     for number, answers in enumerate(questions)])
+        return True
+
+    def isCurrent(self, name, filekey):
+        ''' True if the session name is there and was ingested from a file
+        with the same size and modification time (filekey) '''
+        if filekey[0] is None:
+            return False
+        with contextlib.closing(self.connect()) as connection:
+            row=connection.execute('''SELECT size, mtime FROM sessions
+                WHERE name=?''', (name,)).fetchone()
+        return row is not None and tuple(row)==tuple(filekey)
+
+    def remove(self, connection, session):
+        ''' Delete the rows of a session and take it out of the totals '''
+        connection.execute('''UPDATE totals SET
+            answered=answered-(SELECT answered FROM participation
+                WHERE participation.session=? AND
+                participation.student=totals.student),
+            asked=asked-(SELECT nquestions FROM sessions WHERE id=?)
+            WHERE student IN (SELECT student FROM participation
+                              WHERE session=?)''',
+            (session, session, session))
+        for table in ('answers', 'participation', 'questions'):
+            connection.execute('DELETE FROM ' + table + ' WHERE session=?',
+                               (session,))
+        connection.execute('DELETE FROM sessions WHERE id=?', (session,))
+
+    def setAnswerKey(self, name, number, letter):
+        ''' Set the correct answer of question number of a session, used by
+        difficulty. Ingesting the session again clears it '''
+        with contextlib.closing(self.connect()) as connection:
+            with connection:
+                connection.execute('''UPDATE questions SET correct=?
+                    WHERE number=? AND session=(SELECT id FROM sessions
+                                                WHERE name=?)''',
+                    (answercodes.get(letter.strip().upper()), number, name))
+
+    def participation(self, start=None, end=None, below=None):
+        ''' List of [student ID, questions answered, questions asked, rate]
+        for the sessions between the start and end dates (YYYY-MM-DD, both
+        included, None for no limit), lowest rate first. below keeps only the
+        students whose rate is under it. Without dates the totals are used
+        as they are '''
+        with contextlib.closing(self.connect()) as connection:
+            if start is None and end is None:
+                rows=connection.execute('''SELECT studentid, answered, asked
+                    FROM totals JOIN students ON students.id=totals.student
+                    ''').fetchall()
+            else:
+                rows=connection.execute('''SELECT studentid,
+                    SUM(participation.answered), SUM(sessions.nquestions)
+                    FROM sessions
+                    JOIN participation ON participation.session=sessions.id
+                    JOIN students ON students.id=participation.student
+                    WHERE sessions.date>=? AND sessions.date<?
+                    GROUP BY participation.student''',
+                    dateRange(start, end)).fetchall()
+        results=[[studentid, answered, asked, answered/asked if asked else 0]
+                 for studentid, answered, asked in rows]
+        if below is not None:
+            results=[row for row in results if row[3]<below]
+        results.sort(key=lambda row: (row[3], row[0]))
+        return results
+
+    def distributions(self, start=None, end=None, period='session'):
+        ''' Number of answers to each option A-E and of no choice, per
+        question (period session) or added up per day, week or month, in
+        date order. Each row is the session name and question number, or the
+        period, followed by the six counts '''
+        with contextlib.closing(self.connect()) as connection:
+            if period=='session':
+                return [list(row) for row in connection.execute('''
+                    SELECT name, number, a, b, c, d, e, nochoice
+                    FROM sessions JOIN questions ON questions.session=
+                        sessions.id
+                    WHERE date>=? AND date<? ORDER BY date, number''',
+                    dateRange(start, end))]
+            return [list(row) for row in connection.execute('''
+                SELECT strftime(?, substr(date, 1, 10)) AS period, SUM(a),
+                    SUM(b), SUM(c), SUM(d), SUM(e), SUM(nochoice)
+                FROM sessions JOIN questions ON questions.session=sessions.id
+                WHERE date>=? AND date<? GROUP BY period ORDER BY period''',
+                (periods[period],)+dateRange(start, end))]
+
+    def difficulty(self, start=None, end=None):
+        ''' For each question: session name, number, students that answered,
+        most chosen option and its share, and difficulty from 0 (easy) to 1.
+        With an answer key the difficulty is the share of the students that
+        answered who got it wrong, without one it is how split the class was,
+        one minus the share of the most chosen option '''
+        keys=self.answerKeys()
+        results=[]
+        for row in self.distributions(start, end):
+            name, number, counts=row[0], row[1], row[2:7]
+            voters=sum(counts)
+            top=max(range(5), key=lambda column: counts[column])
+            share=counts[top]/voters if voters else 0
+            correct=keys.get((name, number))
+            if not voters:
+                difficulty=None
+            elif correct:
+                difficulty=1-counts[correct-1]/voters
+            else:
+                difficulty=1-share
+            results.append([name, number, voters, answerletters[top+1],
+                            share, difficulty])
+        return results
+
+    def answerKeys(self):
+        ''' Dictionary of (session name, question number) and correct answer
+        code, for the questions with an answer key '''
+        with contextlib.closing(self.connect()) as connection:
+            return {(name, number): correct for name, number, correct in
+                    connection.execute('''SELECT name, number, correct
+                        FROM sessions JOIN questions ON questions.session=
+                            sessions.id WHERE correct IS NOT NULL''')}
+
+    def history(self, studentid):
+        ''' List of [session name, answer letters] of a student in date
+        order '''
+        with contextlib.closing(self.connect()) as connection:
+            return [[name, [answerletters[code] for code in codes]] for
+                    name, codes in connection.execute('''SELECT name, codes
+                    FROM sessions JOIN answers ON answers.session=sessions.id
+                    JOIN students ON students.id=answers.student
+                    WHERE studentid=? ORDER BY date''', (studentid,))]
+
+    def sessions(self):
+        ''' List of [name, date, number of questions] in date order '''
+        with contextlib.closing(self.connect()) as connection:
+            return [list(row) for row in connection.execute('''SELECT name,
+                date, nquestions FROM sessions ORDER BY date''')]
+
+
+def dateRange(start, end):
+    ''' Bounds for date>=? AND date<? of the days from start to end '''
+    return (start or '', (end or '9999') + '~')
+
+
+def ingestSessionFile(store, sessionfile, iclickerdict, questions=None):
+    ''' Ingest a session file in a SemesterStore, named after the file and
+    dated by sessionDate. questions is the list of answer codes of each
+    question if they were tallied already, otherwise the file is read with
+    batchSession. Returns False, without reading the file, if it was
+    already there unchanged '''
+    stat=os.stat(sessionfile)
+    filekey=(stat.st_size, stat.st_mtime_ns)
+    name=os.path.splitext(os.path.basename(sessionfile))[0]
+    if store.isCurrent(name, filekey):
+        return False
+    if questions is None:
+        questions=batchSession(sessionfile, iclickerdict)
+    return store.ingest(name, sessionDate(sessionfile), questions,
+                        getTallyIndex(iclickerdict).students, filekey)
+
+
+def readAnswerKey(store, keyfile):
+    ''' Reads a csv file with session name, question number and correct
+    answer in each row and sets them in the store '''
+    with open(keyfile, newline='') as incsv:
+        for row in csv.reader(incsv):
+            if len(row)>=3 and row[1].strip().isdigit():
+                store.setAnswerKey(row[0].strip(), int(row[1]), row[2])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Processing of a whole archive of session files in parallel
+"""
+
+import concurrent.futures
+import csv
+import glob
+import os
+
+from .analytics import SemesterStore, ingestSessionFile
+from .export import answerRow, makeSessionCsv
+from .packed import packedSessionFile, writePackedSession
+from .roster import getiClickerData
+from .session import sessionBlocks
+from .tally import batchSession, sessionResults
+
+
+def findSessionFiles(patterns, extension='.xml'):
+    ''' Takes a list of directories, glob patterns or file names and returns
+    the sorted list of session xml files (or files with another extension
+    in the directories) they refer to. iClicker names the session files
+    after the date and time of the session, so sorting them by name puts
+    them in chronological order '''
+    sessionfiles=set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern=os.path.join(pattern, '*'+extension)
+        sessionfiles.update(glob.glob(pattern))
+    return sorted(sessionfiles, key=os.path.basename)
+
+
+# Roster of the archive process pool workers, set by initArchiveWorker
+archiveroster=[]
+
+
+def initArchiveWorker(iclickerfile):
+    ''' Reads the csv file once in each worker process of processArchive '''
+    archiveroster[:]=getiClickerData(iclickerfile)
+
+
+def processSessionFile(sessionfile, outdir, packed=False):
+    ''' Tallies every question of a session file and saves its csv file in
+    outdir, with the name of the session file, plus its packed archive if
+    packed is true. Runs in a worker process of processArchive and returns
+    the name of the session file and the list of answer code bytearrays of
+    its questions '''
+    studentlist, iclickerdict=archiveroster
+    questions=batchSession(sessionfile, iclickerdict)
+    if packed:
+        writePackedSession(packedSessionFile(sessionfile, outdir),
+                           sessionBlocks(sessionfile))
+    name=os.path.splitext(os.path.basename(sessionfile))[0]
+    makeSessionCsv(os.path.join(outdir, name+'.csv'),
+                   sessionResults(iclickerdict, studentlist, questions),
+                   studentlist)
+    return sessionfile, questions
+
+
+def processArchive(iclickerfile, sessionfiles, outdir, workers=None,
+                   packed=False, semesterdb=None):
+    ''' Processes a list of session files in parallel in a pool of worker
+    processes (one per core unless workers is given). Saves the csv file of
+    each session in outdir (and its packed archive if packed is true) and a
+    semester.csv file with the answers of every student to every question of
+    every session, in the order of sessionfiles. The sessions are also added
+    to the SemesterStore in the semesterdb file if one is given.
+    Returns the list of session files that could not be processed, paired
+    with the error they raised '''
+    os.makedirs(outdir, exist_ok=True)
+    studentlist, iclickerdict=getiClickerData(iclickerfile)
+    done={}
+    failed=[]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=initArchiveWorker,
+            initargs=(iclickerfile,)) as pool:
+        futures={pool.submit(processSessionFile, sessionfile, outdir,
+                             packed):
+                 sessionfile for sessionfile in sessionfiles}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                sessionfile, questions=future.result()
+                done[sessionfile]=questions
+            except Exception as error:
+                failed.append([futures[future], error])
+    # Put the sessions together in one semester matrix
+    header=['Student/Team']
+    cumresults={studentid: [] for studentid in studentlist}
+    for sessionfile in sessionfiles:
+        if sessionfile not in done:
+            continue
+        name=os.path.splitext(os.path.basename(sessionfile))[0]
+        questions=done[sessionfile]
+        for i in range(len(questions)):
+            header.append(name + ' Question ' + str(i+1))
+        sessionresults=sessionResults(iclickerdict, studentlist, questions)
+        for studentid in studentlist:
+            cumresults[studentid].extend(sessionresults[studentid])
+    if semesterdb:
+        store=SemesterStore(semesterdb)
+        for sessionfile in sessionfiles:
+            if sessionfile in done:
+                ingestSessionFile(store, sessionfile, iclickerdict,
+                                  done[sessionfile])
+    with open(os.path.join(outdir, 'semester.csv'), 'w') as outcsv:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|', 
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(header)
+        for studentid in studentlist:
+            writer.writerow(answerRow(studentid, cumresults[studentid],
+                                      len(header)-1))
+    return failed
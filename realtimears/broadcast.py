@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Push of the live tallies to any number of viewers with server-sent events
+"""
+
+import asyncio
+import json
+import socket
+import threading
+
+from .tally import TallyIndex, answerletters
+
+
+# Page served at / that shows the counts of the latest question, so a
+# projector or a TA only needs a browser
+viewerpage=b'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>RealTime ARS</title>
+<style>
+body {font-family: Helvetica, sans-serif; margin: 2em}
+td {padding: 0.2em 0.6em} .bar {background: #4a7ab5; height: 1.2em}
+</style></head>
+<body><h1 id="question">Waiting for a poll</h1>
+<table id="counts"></table><p id="status"></p>
+<script>
+var columns=['A', 'B', 'C', 'D', 'E', 'No Choice'];
+function show(data) {
+  if (data.question===null) return;
+  document.getElementById('question').textContent='Question '+data.question;
+  var total=Math.max(1, data.counts.reduce(function(a, b) {return a+b;}));
+  var rows='';
+  for (var i=0; i<columns.length; i++) {
+    rows+='<tr><td>'+columns[i]+'</td><td>'+data.counts[i]+
+          '</td><td><div class="bar" style="width:'+
+          (400*data.counts[i]/total)+'px"></div></td></tr>';
+  }
+  document.getElementById('counts').innerHTML=rows;
+  document.getElementById('status').textContent=data.unregistered ?
+      data.unregistered+' unregistered clickers' : '';
+}
+var events=new EventSource('/events');
+events.addEventListener('snapshot', function(e) {show(JSON.parse(e.data));});
+events.addEventListener('delta', function(e) {show(JSON.parse(e.data));});
+</script></body></html>
+'''
+
+
+def serverEvent(event, sequence, data):
+    ''' Bytes of one server-sent event '''
+    return ('id: ' + str(sequence) + '\nevent: ' + event + '\ndata: ' +
+            json.dumps(data, separators=(',', ':')) + '\n\n').encode()
+
+
+class TallyBroadcaster():
+    ''' asyncio HTTP server that pushes the tallies of a live session to its
+    viewers as server-sent events on /events, with the current state as JSON
+    on /snapshot and a small viewer page on /.
+    publish takes the output of tallyLatest (or a VoteAggregator listener)
+    and sends a delta event with the counts and only the students whose
+    answer changed since the last publish, or since an empty question when a
+    new question starts. Each event is encoded once and the same bytes are
+    queued for every viewer, so a publish costs the same small amount per
+    viewer whatever its size. Every viewer has its own bounded queue and
+    writer task: a viewer that reads too slowly fills its queue, its pending
+    events are then dropped and replaced by one snapshot of the current
+    state, so it catches up without holding memory or slowing the others.
+    The server can run in the asyncio loop of the caller (start) or in its
+    own thread (startThread) next to the Tk main loop, publish and setRoster
+    can be called from any thread '''
+
+    # Seconds between keepalive comments on an idle event stream
+    keepalive=15
+    # Bytes a viewer can have unsent in the kernel and in the transport
+    # before its writer waits, and its events start piling up in its queue
+    sendbuffer=32768
+
+    def __init__(self, iclickerdict, host='127.0.0.1', port=0, queuesize=32,
+                 maxviewers=500):
+        self.host=host
+        self.port=port
+        self.queuesize=queuesize
+        self.maxviewers=maxviewers
+        self.viewers=set()
+        self.server=None
+        self.loop=None
+        self.thread=None
+        self.servetask=None
+        self.events=0
+        self.coalesced=0
+        self.setState(iclickerdict)
+
+    def setState(self, iclickerdict):
+        # Own index, getTallyIndex keeps one for the thread of the worker
+        self.tallyindex=TallyIndex(iclickerdict)
+        self.number=None
+        self.answers=bytearray(len(self.tallyindex.students))
+        self.nunregistered=0
+        self.sequence=0
+        self.snapshot=None
+
+    async def start(self):
+        ''' Start listening in the running loop, port 0 picks a free port
+        which is then stored in self.port '''
+        self.loop=asyncio.get_running_loop()
+        self.server=await asyncio.start_server(self.handle, self.host,
+                                               self.port)
+        self.port=self.server.sockets[0].getsockname()[1]
+        return self
+
+    def startThread(self):
+        ''' Run the server in a daemon thread with its own loop, returns once
+        it is listening '''
+        started=threading.Event()
+
+        async def run():
+            self.servetask=asyncio.current_task()
+            await self.start()
+            started.set()
+            async with self.server:
+                await self.server.serve_forever()
+
+        def target():
+            try:
+                asyncio.run(run())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                started.set()
+
+        self.thread=threading.Thread(target=target, name='TallyBroadcaster',
+                                     daemon=True)
+        self.thread.start()
+        started.wait()
+        if self.server is None:
+            raise OSError('The broadcast server could not start on port ' +
+                          str(self.port))
+        return self
+
+    def call(self, function, *args):
+        ''' Run function in the loop of the server, right away if called from
+        that loop '''
+        if self.loop is None:
+            return
+        try:
+            running=asyncio.get_running_loop()
+        except RuntimeError:
+            running=None
+        if running is self.loop:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def close(self):
+        ''' Stop listening and disconnect the viewers '''
+        if self.loop is not None:
+            self.call(self.shutdown)
+        if self.thread is not None:
+            self.thread.join(2)
+
+    def shutdown(self):
+        self.server.close()
+        for viewer in list(self.viewers):
+            viewer.cancel()
+        if self.servetask is not None:
+            self.servetask.cancel()
+
+    def setRoster(self, iclickerdict):
+        ''' Use a new roster, the viewers get a snapshot of the empty state '''
+        self.call(self.resetRoster, iclickerdict)
+
+    def resetRoster(self, iclickerdict):
+        self.setState(iclickerdict)
+        self.pushAll(None)
+
+    def publish(self, number, answers, organizedresults=None,
+                unregistered=None):
+        ''' Send the latest tally to every viewer. The arguments are those of
+        the output of tallyLatest, organizedresults is not needed since the
+        answer codes say the same '''
+        self.call(self.broadcast, number, bytes(answers),
+                  len(unregistered) if unregistered else 0)
+
+    def broadcast(self, number, answers, nunregistered):
+        ''' Make the delta event of the new answers and queue it for every
+        viewer '''
+        new=number!=self.number
+        if new:
+            previous=bytes(len(answers))
+        elif answers==self.answers and nunregistered==self.nunregistered:
+            return
+        else:
+            previous=self.answers
+        students=self.tallyindex.students
+        changes=[[students[index], answerletters[code]] for index, code
+                 in enumerate(answers) if code!=previous[index]]
+        self.number=number
+        self.answers=bytearray(answers)
+        self.nunregistered=nunregistered
+        self.sequence+=1
+        self.snapshot=None
+        event=serverEvent('delta', self.sequence,
+                          {'question': number, 'sequence': self.sequence,
+                           'new': new,
+                           'counts': self.tallyindex.counts(self.answers),
+                           'unregistered': nunregistered,
+                           'changes': changes})
+        self.events+=1
+        self.pushAll(event)
+
+    def pushAll(self, event):
+        for viewer in self.viewers:
+            viewer.push(event)
+
+    def state(self):
+        ''' Dictionary with the question, counts and answer of each student
+        that made a choice '''
+        return {'question': self.number, 'sequence': self.sequence,
+                'counts': self.tallyindex.counts(self.answers),
+                'unregistered': self.nunregistered,
+                'answers': {studentid: answerletters[code] for studentid, code
+                            in zip(self.tallyindex.students, self.answers)
+                            if code}}
+
+    def snapshotEvent(self):
+        ''' Snapshot event of the current state, made once per sequence
+        number however many viewers need it '''
+        if self.snapshot is None:
+            self.snapshot=serverEvent('snapshot', self.sequence, self.state())
+        return self.snapshot
+
+    async def handle(self, reader, writer):
+        ''' Answer one HTTP request '''
+        try:
+            request=await reader.readuntil(b'\r\n\r\n')
+            method, path=request.split(b' ', 2)[:2]
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError):
+            writer.close()
+            return
+        path=path.split(b'?')[0]
+        if method!=b'GET':
+            respond(writer, b'405 Method Not Allowed', b'text/plain',
+                    b'Only GET is supported\n')
+        elif path==b'/events':
+            if len(self.viewers)>=self.maxviewers:
+                respond(writer, b'503 Service Unavailable', b'text/plain',
+                        b'Too many viewers\n')
+            else:
+                await Viewer(self, writer).run()
+                return
+        elif path==b'/snapshot':
+            respond(writer, b'200 OK', b'application/json',
+                    json.dumps(self.state()).encode())
+        elif path==b'/':
+            respond(writer, b'200 OK', b'text/html; charset=utf-8',
+                    viewerpage)
+        else:
+            respond(writer, b'404 Not Found', b'text/plain', b'Not found\n')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+def respond(writer, status, contenttype, body):
+    writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Type: ' + contenttype +
+                 b'\r\nContent-Length: ' + str(len(body)).encode() +
+                 b'\r\nConnection: close\r\n\r\n' + body)
+
+
+class Viewer():
+    ''' Event stream of one viewer. The queue holds encoded events, None
+    stands for a snapshot of the state at the time it is written '''
+
+    def __init__(self, broadcaster, writer):
+        self.broadcaster=broadcaster
+        self.writer=writer
+        self.queue=asyncio.Queue(broadcaster.queuesize)
+        self.task=None
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up, replace what is pending by a snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            self.broadcaster.coalesced+=1
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        self.task=asyncio.current_task()
+        self.broadcaster.viewers.add(self)
+        writer=self.writer
+        connection=writer.get_extra_info('socket')
+        if connection is not None:
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                                  self.broadcaster.sendbuffer)
+        writer.transport.set_write_buffer_limits(self.broadcaster.sendbuffer)
+        try:
+            writer.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: text/event-stream\r\n'
+                         b'Cache-Control: no-cache\r\n\r\n')
+            self.queue.put_nowait(None)
+            while True:
+                try:
+                    event=await asyncio.wait_for(
+                            self.queue.get(), self.broadcaster.keepalive)
+                except asyncio.TimeoutError:
+                    event=b': keepalive\n\n'
+                if event is None:
+                    event=self.broadcaster.snapshotEvent()
+                writer.write(event)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.broadcaster.viewers.discard(self)
+            writer.close()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+On disk cache of parsed session files
+"""
+
+import contextlib
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+
+def cacheDirectory():
+    ''' Directory for the files the script keeps between runs: the user's
+    cache directory (XDG_CACHE_HOME, LOCALAPPDATA on Windows or ~/.cache)
+    '''
+    base=(os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+          or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'RealTimeARS')
+
+
+class ParseCache():
+    ''' On disk cache of parsed session files, stored in an SQLite
+    database. Entries are kept per file name and kind of data (the blocks
+    of a session for its reader, or the answer codes of a session for a
+    roster) with the size, modification time and a hash of the content of
+    the file when it was parsed, and are used only if all of them still
+    match. Values are pickled and compressed. When the stored values take
+    more than maxbytes the least recently used entries are evicted. Any
+    problem with the database is treated as a cache miss, and a corrupt
+    database file is deleted and created again, so the cache can never stop
+    a file from being read '''
+
+    def __init__(self, cachefile, maxbytes=64*1024*1024):
+        self.cachefile=cachefile
+        self.maxbytes=maxbytes
+        self.enabled=os.environ.get('REALTIMEARS_CACHE', '1')!='0'
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.cachefile), exist_ok=True)
+        # A connection per call, so the cache can be used from the worker
+        # thread and from worker processes
+        connection=sqlite3.connect(self.cachefile, timeout=10)
+        connection.execute('''CREATE TABLE IF NOT EXISTS entries (
+            path TEXT, kind TEXT, size INTEGER, mtime INTEGER, digest TEXT,
+            used REAL, bytes INTEGER, data BLOB, PRIMARY KEY (path, kind))''')
+        return connection
+
+    def fileKey(self, filename):
+        ''' Size, modification time and content hash of a file, None if the
+        cache is disabled or the file can't be read '''
+        if not self.enabled:
+            return None
+        try:
+            stat=os.stat(filename)
+            digest=hashlib.blake2b(digest_size=16)
+            with open(filename, 'rb') as infile:
+                for chunk in iter(lambda: infile.read(1<<16), b''):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+    def get(self, filename, kind, key):
+        ''' Cached value for the file with the given fileKey, or None '''
+        if key is None:
+            return None
+        path=os.path.abspath(filename)
+        try:
+            with contextlib.closing(self.connect()) as connection:
+                row=connection.execute('''SELECT size, mtime, digest, data
+                    FROM entries WHERE path=? AND kind=?''',
+                    (path, kind)).fetchone()
+                if row is None or tuple(row[:3])!=key:
+                    return None
+                value=pickle.loads(zlib.decompress(row[3]))
+                with connection:
+                    connection.execute('''UPDATE entries SET used=?
+                        WHERE path=? AND kind=?''', (time.time(), path, kind))
+                return value
+        except sqlite3.DatabaseError as error:
+            self.recover(error)
+        except Exception:
+            # Undecodable entry, will be replaced by the next put
+            pass
+        return None
+
+    def put(self, filename, kind, key, value):
+        ''' Store the value parsed from the file with the given fileKey '''
+        if key is None:
+            return
+        data=zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)
+        try:
+            with contextlib.closing(self.connect()) as connection:
+                with connection:
+                    connection.execute('''INSERT OR REPLACE INTO entries
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                        (os.path.abspath(filename), kind)+tuple(key)+
+                        (time.time(), len(data), data))
+                    self.evict(connection)
+        except sqlite3.DatabaseError as error:
+            self.recover(error)
+        except OSError:
+            pass
+
+    def evict(self, connection):
+        ''' Delete the least recently used entries until the stored values
+        take at most maxbytes '''
+        total=connection.execute('SELECT SUM(bytes) FROM entries').fetchone()[0]
+        if total is None or total<=self.maxbytes:
+            return
+        for rowid, size in connection.execute('''SELECT rowid, bytes
+                FROM entries ORDER BY used''').fetchall():
+            connection.execute('DELETE FROM entries WHERE rowid=?', (rowid,))
+            total-=size
+            if total<=self.maxbytes:
+                return
+
+    def recover(self, error):
+        ''' Delete the database file if it is not a valid database '''
+        if isinstance(error, sqlite3.OperationalError):
+            # Locked or read only, leave it alone
+            return
+        try:
+            os.remove(self.cachefile)
+        except OSError:
+            pass
+
+
+parsecache=ParseCache(os.path.join(cacheDirectory(), 'parsecache.sqlite'))
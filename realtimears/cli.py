@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+from . import timing
+from .analytics import (SemesterStore, ingestSessionFile, periods,
+                        readAnswerKey)
+from .archive import findSessionFiles, processArchive
+from .export import (makeDistributionCsv, makeSessionCsv, makeTimelineCsv,
+                     readSessionLog, sessionLogFile, writeSessionMatrix)
+from .packed import PackedSession, packSession, packedSessionFile
+from .roster import loadRoster
+from .session import sessionBlocks
+from .tally import batchSession, sessionResults
+from .timeline import VoteTimeline
+
+
+def main(arguments=None):
+    ''' Entry point of the script. Without a command it launches the TKinter
+    interface, which is only imported then, so the commands never load Tk.
+    The batch command reads a csv file with the iClicker information and a
+    session xml file and saves the answer of every student to every question
+    in a csv file, plus optionally the number of students that chose each
+    option per question and the answer changes and response times of each
+    question. The archive command does the same for many session files in
+    parallel and puts them together in a semester file. The pack command
+    converts session files to the packed binary archive and the history
+    command shows the answers of a student in packed sessions. The semester
+    command adds sessions to the semester database and the report command
+    queries it for participation, difficulty and answer distributions. The
+    recover command saves the answers kept in the SessionLog of a session
+    that was not saved. The serve and forward commands send the votes of
+    several base stations over the network to one aggregator. With --timing
+    the time spent in each stage is recorded and saved in a JSON file at
+    exit. With --broadcast the live tallies of the interface or of the serve
+    command are pushed to any number of browsers '''
+    parser=argparse.ArgumentParser(
+            description='Real time monitoring of iClicker polling sessions. '
+                        'Run without a command to open the graphical '
+                        'interface')
+    parser.add_argument('--timing', metavar='FILE',
+            help='record the time spent in each stage and save the '
+                 'statistics in a JSON file at exit')
+    parser.add_argument('--latency-target', type=float, metavar='MS',
+            help='milliseconds within which results should be on screen '
+                 'after the session file changes')
+    parser.add_argument('--broadcast', type=int, metavar='PORT',
+            help='push the live tallies to viewers on this HTTP port, '
+                 'open http://host:PORT/ in a browser to follow a poll')
+    parser.add_argument('--broadcast-host', default='127.0.0.1',
+            metavar='HOST', help='address the viewers connect to, 0.0.0.0 '
+                                 'for every network (default: %(default)s)')
+    commands=parser.add_subparsers(dest='command')
+    batch=commands.add_parser('batch',
+            help='save the answers to every question of a session')
+    batch.add_argument('iclickerfile',
+            help='csv file with student ID and iClicker ID in each row')
+    batch.add_argument('sessionfile', help='iClicker session xml file')
+    batch.add_argument('-o', '--output', required=True,
+            help='csv file for the answers of each student')
+    batch.add_argument('-d', '--distributions',
+            help='csv file for the number of answers per option')
+    batch.add_argument('-t', '--timeline',
+            help='csv file for the answer changes and response times of '
+                 'each question')
+    archive=commands.add_parser('archive',
+            help='save the answers to every session in a directory, using '
+                 'all cores')
+    archive.add_argument('iclickerfile',
+            help='csv file with student ID and iClicker ID in each row')
+    archive.add_argument('sessions', nargs='+',
+            help='directories, glob patterns or names of session xml files')
+    archive.add_argument('-o', '--outdir', required=True,
+            help='directory for the csv file of each session and the '
+                 'semester.csv file with all of them')
+    archive.add_argument('-j', '--jobs', type=int,
+            help='number of worker processes (default: one per core)')
+    archive.add_argument('-p', '--packed', action='store_true',
+            help='also save the packed archive of each session')
+    archive.add_argument('--db', metavar='FILE',
+            help='also add the sessions to this semester database')
+    semester=commands.add_parser('semester',
+            help='add sessions to the semester database, only new or '
+                 'changed ones are read')
+    semester.add_argument('iclickerfile',
+            help='csv file with student ID and iClicker ID in each row')
+    semester.add_argument('sessions', nargs='*',
+            help='directories, glob patterns or names of session xml files')
+    semester.add_argument('--db', default='semester.sqlite', metavar='FILE',
+            help='semester database (default: %(default)s)')
+    semester.add_argument('-k', '--key', metavar='FILE',
+            help='csv file with session name, question number and correct '
+                 'answer in each row')
+    report=commands.add_parser('report',
+            help='query the semester database')
+    report.add_argument('query',
+            choices=['participation', 'difficulty', 'distribution',
+                     'sessions'])
+    report.add_argument('--db', default='semester.sqlite', metavar='FILE',
+            help='semester database (default: %(default)s)')
+    report.add_argument('--from', dest='start', metavar='YYYY-MM-DD',
+            help='first day of the sessions included')
+    report.add_argument('--to', dest='end', metavar='YYYY-MM-DD',
+            help='last day of the sessions included')
+    report.add_argument('--below', type=float, metavar='RATE',
+            help='participation: only students that answered less than '
+                 'this fraction of the questions, e.g. 0.7')
+    report.add_argument('--by', default='session', choices=sorted(periods),
+            help='distribution: per question (session) or added up per '
+                 'day, week or month')
+    report.add_argument('-o', '--output',
+            help='csv file for the results (default: print them)')
+    pack=commands.add_parser('pack',
+            help='convert session xml files to packed archives, compact '
+                 'and quick to read by question or by student')
+    pack.add_argument('sessions', nargs='+',
+            help='directories, glob patterns or names of session xml files')
+    pack.add_argument('-o', '--outdir',
+            help='directory for the packed files (default: next to each '
+                 'session file)')
+    history=commands.add_parser('history',
+            help='show the answers of a student in packed sessions')
+    history.add_argument('iclickerfile',
+            help='csv file with student ID and iClicker ID in each row')
+    history.add_argument('student', help='student ID')
+    history.add_argument('sessions', nargs='+',
+            help='directories, glob patterns or names of packed files')
+    recover=commands.add_parser('recover',
+            help='save the answers logged for a session that was not saved')
+    recover.add_argument('sessionfile',
+            help='iClicker session xml file, or the log file itself')
+    recover.add_argument('-o', '--output', required=True,
+            help='csv file for the answers of each student')
+    serve=commands.add_parser('serve',
+            help='receive votes from the forwarders of several base '
+                 'stations and tally them together')
+    serve.add_argument('iclickerfile',
+            help='csv file with student ID and iClicker ID in each row')
+    serve.add_argument('--host', default='127.0.0.1',
+            help='address to listen on (default: %(default)s)')
+    serve.add_argument('--port', type=int, default=8470,
+            help='TCP port for the forwarders (default: %(default)s)')
+    forward=commands.add_parser('forward',
+            help='send the votes of a local session file to a serve '
+                 'command')
+    forward.add_argument('sessionfile', help='iClicker session xml file')
+    forward.add_argument('--station', required=True,
+            help='name of this base station, e.g. the room')
+    forward.add_argument('--host', default='127.0.0.1',
+            help='address of the serve command (default: %(default)s)')
+    forward.add_argument('--port', type=int, default=8470,
+            help='TCP port of the serve command (default: %(default)s)')
+    forward.add_argument('--interval', type=float, default=0.5,
+            help='seconds between checks of the session file')
+    options=parser.parse_args(arguments)
+    if options.timing:
+        timing.enable()
+    if options.latency_target is not None:
+        timing.setTarget(options.latency_target)
+    try:
+        return runCommand(options)
+    finally:
+        if options.timing:
+            timing.exportJson(options.timing)
+
+
+def runCommand(options):
+    ''' Runs the command chosen in the options parsed by main '''
+    if options.command is None:
+        from .gui import mainMenu
+        broadcaster=None
+        if options.broadcast is not None:
+            from .broadcast import TallyBroadcaster
+            broadcaster=TallyBroadcaster({}, options.broadcast_host,
+                                         options.broadcast).startThread()
+        mainMenu(broadcaster)
+        return 0
+    if options.command=='recover':
+        logfile=options.sessionfile
+        if not logfile.endswith('.log'):
+            logfile=sessionLogFile(logfile)
+        studentlist, questions=readSessionLog(logfile)
+        writeSessionMatrix(options.output, studentlist, questions)
+        print(len(questions), 'questions saved to', options.output)
+        return 0
+    # asyncio and the modules that use it are imported only by the commands
+    # that need them, they take longer to load than Tk
+    if options.command=='serve':
+        import asyncio
+        try:
+            asyncio.run(serveIngest(options))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if options.command=='forward':
+        import asyncio
+        from .ingest import forwardSession
+        try:
+            asyncio.run(forwardSession(options.sessionfile,
+                    options.station, options.host, options.port,
+                    options.interval))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if options.command=='pack':
+        sessionfiles=findSessionFiles(options.sessions)
+        if not sessionfiles:
+            print('No session files found', file=sys.stderr)
+            return 1
+        if options.outdir:
+            os.makedirs(options.outdir, exist_ok=True)
+        for sessionfile in sessionfiles:
+            packSession(sessionfile, packedSessionFile(sessionfile,
+                                                       options.outdir))
+        print(len(sessionfiles), 'sessions packed')
+        return 0
+    if options.command=='history':
+        roster=loadRoster(options.iclickerfile)
+        iclickerids=roster.clickersOf(options.student)
+        if not iclickerids:
+            print('Student', options.student, 'is not in the roster',
+                  file=sys.stderr)
+            return 1
+        for packedfile in findSessionFiles(options.sessions, '.rtars'):
+            name=os.path.splitext(os.path.basename(packedfile))[0]
+            with PackedSession(packedfile) as packed:
+                print(name + ',' + ','.join(packed.history(iclickerids)))
+        return 0
+    if options.command=='semester':
+        store=SemesterStore(options.db)
+        iclickerdict=loadRoster(options.iclickerfile).iclickerdict
+        sessionfiles=findSessionFiles(options.sessions)
+        added=sum(1 for sessionfile in sessionfiles
+                  if ingestSessionFile(store, sessionfile, iclickerdict))
+        if options.key:
+            readAnswerKey(store, options.key)
+        print(added, 'sessions added,', len(store.sessions()),
+              'in', options.db)
+        return 0
+    if options.command=='report':
+        return printReport(options)
+    if options.command=='archive':
+        sessionfiles=findSessionFiles(options.sessions)
+        if not sessionfiles:
+            print('No session files found', file=sys.stderr)
+            return 1
+        failed=processArchive(options.iclickerfile, sessionfiles,
+                              options.outdir, options.jobs, options.packed,
+                              options.db)
+        for sessionfile, error in failed:
+            print(sessionfile, 'could not be processed:', error,
+                  file=sys.stderr)
+        print(len(sessionfiles)-len(failed), 'sessions saved to',
+              options.outdir)
+        return 1 if failed else 0
+    roster=loadRoster(options.iclickerfile)
+    studentlist, iclickerdict=roster.studentlist, roster.iclickerdict
+    for iclickerid in sorted(roster.duplicates):
+        print('iClicker ID', iclickerid, 'registered more than once:',
+              ', '.join(roster.duplicates[iclickerid]), file=sys.stderr)
+    unknown=roster.validate(itertools.chain.from_iterable(block[0] for block
+            in sessionBlocks(options.sessionfile)))
+    if unknown:
+        print('Answers from unregistered iClicker IDs left out:',
+              ', '.join(unknown), file=sys.stderr)
+    questions=batchSession(options.sessionfile, iclickerdict)
+    makeSessionCsv(options.output, sessionResults(iclickerdict, studentlist,
+                                                  questions), studentlist)
+    if options.distributions:
+        makeDistributionCsv(options.distributions, iclickerdict, questions)
+    if options.timeline:
+        votetimeline=VoteTimeline(iclickerdict)
+        votetimeline.update(sessionBlocks(options.sessionfile))
+        makeTimelineCsv(options.timeline, votetimeline)
+    print(len(questions), 'questions saved to', options.output)
+    return 0
+
+
+def printReport(options):
+    ''' Runs a query of the report command and writes its rows as csv '''
+    if not os.path.exists(options.db):
+        print('No semester database', options.db, file=sys.stderr)
+        return 1
+    store=SemesterStore(options.db)
+    if options.query=='participation':
+        header=['Student/Team', 'Answered', 'Asked', 'Rate']
+        rows=store.participation(options.start, options.end, options.below)
+    elif options.query=='difficulty':
+        header=['Session', 'Question', 'Answered', 'Most chosen', 'Share',
+                'Difficulty']
+        rows=store.difficulty(options.start, options.end)
+    elif options.query=='distribution':
+        header=(['Session', 'Question'] if options.by=='session' else
+                [options.by.capitalize()])
+        header+=['A', 'B', 'C', 'D', 'E', 'No Choice']
+        rows=store.distributions(options.start, options.end, options.by)
+    else:
+        header=['Session', 'Date', 'Questions']
+        rows=store.sessions()
+    outcsv=open(options.output, 'w') if options.output else sys.stdout
+    try:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|',
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([round(value, 3) if isinstance(value, float)
+                             else value for value in row])
+    finally:
+        if options.output:
+            outcsv.close()
+    return 0
+
+
+async def serveIngest(options):
+    ''' Runs the ingest server of the serve command, printing a summary of
+    the latest tally of each question as votes arrive '''
+    from . import ingest
+    from .broadcast import TallyBroadcaster
+    aggregator=ingest.VoteAggregator(loadRoster(options.iclickerfile)
+                                     .iclickerdict)
+    aggregator.listeners.append(lambda *tallied: print(
+            ingest.describeTally(*tallied), flush=True))
+    if options.broadcast is not None:
+        broadcaster=await TallyBroadcaster(aggregator.iclickerdict,
+                options.broadcast_host, options.broadcast).start()
+        aggregator.listeners.append(broadcaster.publish)
+        print('Viewers on http://' + options.broadcast_host + ':' +
+              str(broadcaster.port) + '/', flush=True)
+    server=await ingest.IngestServer(aggregator, options.host,
+                                     options.port).start()
+    print('Listening for forwarders on', options.host + ':' +
+          str(server.port), flush=True)
+    await server.serveForever()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Saving of session results in csv files
+"""
+
+import csv
+import hashlib
+import os
+import threading
+
+from .cache import cacheDirectory
+from .tally import answercodes, answerletters, getTallyIndex
+from .timeline import responseedges
+from .timing import timed
+
+
+@timed('save')
+def makeSessionCsv(namecsvfile, cumresults, studentlist):
+    ''' Called from saveSession, receives namecsvfile (name of the file in 
+    which session results will be saved), cumresults (dictionary of students ID
+    as key and answer choices for each question as value), and studentlist 
+    (list of student IDs in the same order as in the original file matching 
+    them to iClicker IDs). Saves a .csv file with name namecsvfile whose 
+    headers are Student/Team and then each question number. Subsequent rows
+    are the student ID (in same order as in original csv file) and the answer
+    choice for each question. Every row has one column per question, empty
+    if the student did not answer'''
+    # Get number of questions
+    nquestions=max([len(cumresults[studentid]) for studentid in studentlist],
+                   default=0)
+    with open(namecsvfile, 'w') as outcsv:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|', 
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        # Add column headers
+        header=['Student/Team']
+        for i in range(nquestions):
+            index='Question ' + str(i+1)
+            header.append(index)
+        writer.writerow(header)
+        # Add each student ID row
+        for studentid in studentlist:
+            writer.writerow(answerRow(studentid, cumresults[studentid],
+                                      nquestions))
+    return
+
+
+def answerRow(studentid, rowanswers, nquestions):
+    ''' Row of the session csv file for a student: the student ID followed by
+    the answer to each of nquestions questions. rowanswers is the list of
+    answers of the student from cumresults, each one a one element list or
+    empty if the student did not answer '''
+    row=[studentid] # first column is studentID
+    row.extend([answer[0] if answer else '' for answer in rowanswers])
+    row.extend(['']*(nquestions-len(rowanswers)))
+    return row
+
+
+def makeDistributionCsv(namecsvfile, iclickerdict, questions):
+    ''' Saves a .csv file with name namecsvfile with the number of students
+    that chose each option in each question. questions is a list with the
+    bytearray of answer codes of each question, as returned by TallyIndex '''
+    tallyindex=getTallyIndex(iclickerdict)
+    with open(namecsvfile, 'w') as outcsv:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|', 
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(['Question', 'A', 'B', 'C', 'D', 'E', 'No Choice'])
+        for number, answers in enumerate(questions):
+            writer.writerow([number+1]+tallyindex.counts(answers))
+    return
+
+
+def makeTimelineCsv(namecsvfile, votetimeline):
+    ''' Saves a .csv file with name namecsvfile with a row per question of
+    the VoteTimeline: the number of votes and of students that voted, the
+    students that changed their answer and the total changes, the median
+    and 90th percentile of the time of the first vote of each student, and
+    the histogram of those times '''
+    edges=responseedges
+    with open(namecsvfile, 'w') as outcsv:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|', 
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(['Question', 'Votes', 'Voters', 'Changed answer',
+                         'Answer changes', 'Median response (s)',
+                         '90th percentile response (s)']+
+                        ['<=' + str(edge) + ' s' for edge in edges]+
+                        ['>' + str(edges[-1]) + ' s'])
+        for number, questiontimeline in enumerate(votetimeline.questions):
+            summary=questiontimeline.summary()
+            writer.writerow([number+1, summary['votes'], summary['voters'],
+                             summary['changers'], summary['changes'],
+                             summary['median'], summary['p90']]+
+                            (questiontimeline.responseHistogram(edges)
+                             if questiontimeline.timed else []))
+    return
+
+
+def sessionLogFile(sessionfile):
+    ''' Name of the SessionLog of a session file, in the cache directory. It
+    is named after the session file plus a hash of its full path, so the
+    log is found again if the same session file is opened after a crash '''
+    path=os.path.abspath(sessionfile)
+    name=os.path.splitext(os.path.basename(path))[0]
+    digest=hashlib.blake2b(os.fsencode(path), digest_size=4).hexdigest()
+    return os.path.join(cacheDirectory(), 'sessionlogs',
+                        name + '-' + digest + '.log')
+
+
+class SessionLog():
+    ''' Write ahead log of the answers of a polling session. It is a csv file
+    whose first row is Student/Team and the student IDs of studentlist, and
+    then one row per tallied question: the question number followed by the
+    answer of each student in the order of studentlist. Rows are appended
+    and flushed to disk as soon as a question is tallied, and only when its
+    answers changed, so nothing is rewritten while the session grows. A
+    question tallied several times has several rows and the last one wins.
+    materialize writes the final session csv file from the log in one pass.
+    If the log already exists for the same studentlist (the program was
+    restarted on the same session) new rows are added to it, if the
+    studentlist changed the old log is kept with an .old extension.
+    The log is written by the worker and saved and closed from the main
+    loop, a lock keeps them apart and rows appended after close are
+    dropped '''
+
+    def __init__(self, logfile, studentlist):
+        self.logfile=logfile
+        self.studentlist=list(studentlist)
+        # Last answer codes written for each question number
+        self.written={}
+        self.lock=threading.Lock()
+        header=['Student/Team']+self.studentlist
+        os.makedirs(os.path.dirname(os.path.abspath(logfile)), exist_ok=True)
+        if os.path.exists(logfile):
+            with open(logfile, newline='') as incsv:
+                oldheader=next(csv.reader(incsv, delimiter=',',
+                                          quotechar='|'), None)
+            if oldheader!=header:
+                os.replace(logfile, logfile + '.old')
+        self.outcsv=open(logfile, 'a', newline='')
+        self.writer=csv.writer(self.outcsv, delimiter=',', quotechar='|',
+                               quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        if self.outcsv.tell()==0:
+            self.writer.writerow(header)
+            self.flush()
+
+    @timed('log')
+    def append(self, number, answers, tallyindex):
+        ''' Log the answer codes of question number, from tallyindex '''
+        with self.lock:
+            if self.outcsv.closed or self.written.get(number)==answers:
+                return
+            self.written[number]=bytes(answers)
+            self.writer.writerow([number]+[tallyindex.answerOf(answers,
+                                                               studentid)
+                                           for studentid in self.studentlist])
+            self.flush()
+
+    def lastLogged(self):
+        ''' Number of the latest question logged by this SessionLog, None if
+        there is none yet '''
+        with self.lock:
+            return max(self.written, default=None)
+
+    def flush(self):
+        self.outcsv.flush()
+        os.fsync(self.outcsv.fileno())
+
+    def close(self):
+        with self.lock:
+            self.outcsv.close()
+
+    @timed('save')
+    def materialize(self, namecsvfile):
+        ''' Saves the session csv file, as makeSessionCsv would, from the
+        log. The log is read once keeping one byte per answer '''
+        with self.lock:
+            if not self.outcsv.closed:
+                self.outcsv.flush()
+            studentlist, questions=readSessionLog(self.logfile)
+        writeSessionMatrix(namecsvfile, studentlist, questions)
+
+
+def readSessionLog(logfile):
+    ''' Reads a SessionLog file and returns its studentlist and a list with
+    the latest bytes of answer codes of each question, the one of question
+    number n at index n-1. Questions missing from the log get no answers, so
+    the columns keep their numbers. Rows cut short by a crash are ignored '''
+    latest={}
+    with open(logfile, newline='') as incsv:
+        reader=csv.reader(incsv, delimiter=',', quotechar='|')
+        studentlist=next(reader)[1:]
+        for row in reader:
+            if len(row)!=len(studentlist)+1:
+                continue
+            latest[int(row[0])]=bytes(answercodes.get(answer, 0)
+                                      for answer in row[1:])
+    empty=bytes(len(studentlist))
+    return studentlist, [latest.get(number, empty)
+                         for number in range(1, max(latest, default=0)+1)]
+
+
+def writeSessionMatrix(namecsvfile, studentlist, questions):
+    ''' Saves a session csv file like makeSessionCsv from a list with the
+    answer codes of each question, one per student of studentlist, writing
+    one row at a time '''
+    with open(namecsvfile, 'w') as outcsv:
+        writer=csv.writer(outcsv, delimiter=',', quotechar='|',
+                          quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(['Student/Team']+['Question ' + str(i+1)
+                                          for i in range(len(questions))])
+        for index, studentid in enumerate(studentlist):
+            writer.writerow([studentid]+[answerletters[answers[index]]
+                                         for answers in questions])
+    return
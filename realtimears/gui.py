@@ -0,0 +1,720 @@
+# -*- coding: utf-8 -*-
+"""
+TKinter interface
+"""
+
+import queue
+import time
+import traceback
+import tkinter
+import tkinter.font
+from tkinter import *
+from tkinter import ttk
+from tkinter import messagebox
+from tkinter import filedialog
+
+from . import timing
+from .export import SessionLog, makeSessionCsv, sessionLogFile
+from .roster import getiClickerData, loadRoster
+from .tally import (batchSession, getTallyIndex, organizedChanges,
+                    sessionResults)
+from .timeline import VoteTimeline, describeTimeline, tallyTimeline
+from .watch import SessionWatcher
+from .worker import TallyWorker
+
+
+def dispResults1():
+    ''' invoke function to get the names of the csv and xml files, if it
+    returns false then return to main menu. Otherwise the files are read by
+    the background worker with loadSession, so the interface stays responsive
+    while a large session file is parsed. loadSession returns the dictionary
+    of students and their iClicker ID, the ordered list of students, and the
+    results of the latest question in the polling session as returned by
+    tallyLatest: the number of the question, the bytearray with the answer
+    code of each student, and a list of lists with six sublists: the
+    students that chose options A-E, and those that did not make any choice.
+    Those are then displayed in a ResultsView by a LiveSession, which
+    watches the XML file and updates the window every time the base writes
+    new answers, and offers to save the session when it is closed'''
+    gotfiles=getFiles()
+    if (gotfiles==False):
+        return
+    iclickerfile, sessionfile=gotfiles
+    root.configure(cursor='watch')
+    worker.submit(sessionfile, loadSession, (iclickerfile, sessionfile),
+                  startLiveSession, loadFailed)
+    return
+
+
+def startLiveSession(loaded):
+    ''' Called by the worker with the output of loadSession once the files
+    have been read, shows the results and keeps them updated from here on '''
+    root.configure(cursor='')
+    roster=loaded[0]
+    if roster.duplicates:
+        m3=messagebox.showinfo(message='These iClicker IDs are registered \
+        \nmore than once, the last student is used:\n' +
+                ', '.join(sorted(roster.duplicates)))
+    LiveSession(*loaded)
+
+
+def loadFailed(error):
+    ''' Called by the worker if loadSession raised an error '''
+    root.configure(cursor='')
+    m3=messagebox.showinfo(message='There was a problem with the files\
+            \nPlease try again')
+
+
+def loadSession(iclickerfile, sessionfile):
+    ''' Reads the csv and xml files, tallies the latest question and writes
+    it to the SessionLog of the session. Returns a list with the Roster, the
+    name of the xml file, the output of tallyTimeline, the VoteTimeline and
+    the SessionLog of the session. Runs in the background worker '''
+    roster=loadRoster(iclickerfile)
+    votetimeline=VoteTimeline(roster.iclickerdict)
+    tallied=tallyTimeline(sessionfile, roster.iclickerdict, votetimeline)
+    log=SessionLog(sessionLogFile(sessionfile), roster.studentlist)
+    log.append(tallied[0], tallied[1], getTallyIndex(roster.iclickerdict))
+    return [roster, sessionfile]+list(tallied)+[votetimeline, log]
+
+
+def tallyUpdate(sessionfile, iclickerdict, votetimeline, log):
+    ''' tallyTimeline, also writing to log the answers of the latest
+    question and of the ones from the latest logged before, which may have
+    got their last votes since they were logged, so the main loop only has
+    to show the results. Runs in the worker '''
+    tallied=tallyTimeline(sessionfile, iclickerdict, votetimeline)
+    number, answers=tallied[:2]
+    tallyindex=getTallyIndex(iclickerdict)
+    logged=log.lastLogged()
+    if logged is not None:
+        for previous, previousanswers in votetimeline.answersOf(logged,
+                                                                number-1):
+            log.append(previous, previousanswers, tallyindex)
+    log.append(number, answers, tallyindex)
+    return tallied
+
+
+class LiveSession():
+    ''' Live monitoring of a polling session. Shows the results of the latest
+    question in a results window and starts a SessionWatcher on the XML file.
+    The watcher runs in its own thread and only puts a token in a queue when
+    the file changed, the queue is drained from the Tk main loop with
+    root.after and each change is handed to the background worker, which
+    reads and tallies the new answers. If the file changes again before the
+    worker is done the older result is dropped as stale.
+    The answers of every question seen while monitoring are written to the
+    SessionLog of the session file by the worker as soon as they are
+    tallied, including the last votes of a question that ended between two
+    updates, so they are not lost if the program stops and the main loop
+    never waits for the disk, and the csv file is made from the log when
+    the session is saved. The VoteTimeline of the session is kept up to
+    date in the worker as well, and the answer changes and median response
+    time of the latest question are shown in the status line '''
+
+    # Milliseconds between checks of the watcher queue
+    checkinterval=100
+
+    def __init__(self, roster, sessionfile, number, answers, organizedresults,
+                 unregistered, summary, votetimeline, log):
+        self.sessionfile=sessionfile
+        self.votetimeline=votetimeline
+        self.iclickerdict=roster.iclickerdict
+        self.studentlist=roster.studentlist
+        self.log=log
+        self.view=ResultsView(organizedresults, self.close)
+        self.view.showStatus(number, unregistered, summary)
+        if broadcaster is not None:
+            broadcaster.setRoster(self.iclickerdict)
+            broadcaster.publish(number, answers, organizedresults,
+                                unregistered)
+        self.changes=queue.Queue()
+        self.watcher=SessionWatcher(sessionfile, self.changes)
+        self.watcher.start()
+        self.afterid=root.after(self.checkinterval, self.checkChanges)
+
+    def checkChanges(self):
+        ''' Drain the watcher queue and have the worker read the new answers
+        if the file changed since the last check '''
+        changed=None
+        while True:
+            try:
+                # Time of the first write of the burst, keep the earliest
+                first=self.changes.get_nowait()
+                if changed is None or first<changed:
+                    changed=first
+            except queue.Empty:
+                break
+        if changed is not None:
+            worker.submit(self.sessionfile, tallyUpdate,
+                          (self.sessionfile, self.iclickerdict,
+                           self.votetimeline, self.log),
+                          lambda tallied: self.update(tallied, changed),
+                          self.updateFailed)
+        self.afterid=root.after(self.checkinterval, self.checkChanges)
+
+    def update(self, tallied, changed=None):
+        ''' Called by the worker with the output of tallyUpdate, shows the
+        new answers in the results window. changed is the time.monotonic()
+        when the file started changing, used to record the end to end
+        latency if timing is enabled '''
+        number, answers, organizedresults, unregistered, summary=tallied
+        self.view.update(organizedresults)
+        self.view.showStatus(number, unregistered, summary)
+        if broadcaster is not None:
+            broadcaster.publish(number, answers, organizedresults,
+                                unregistered)
+        if timing.enabled and changed is not None:
+            # Draw the window now so the time includes the drawing
+            self.view.window.update_idletasks()
+            timing.record(timing.endtoend, (time.monotonic()-changed)*1000)
+
+    def updateFailed(self, error):
+        ''' Called by the worker if reading or tallying the file failed. A
+        half written block is already left for the next change by the
+        reader, so this is a real problem (the file was moved or deleted, or
+        has no answers): it is shown in the status line, and the results
+        stay as they were until an update succeeds '''
+        self.view.showError(error)
+
+    def close(self):
+        ''' Stop monitoring, close the window and offer to save results '''
+        root.after_cancel(self.afterid)
+        self.watcher.stop()
+        # Drop any update still in the worker
+        worker.cancel(self.sessionfile)
+        self.view.destroy()
+        m4=messagebox.askquestion(message='Do you want to save the results\
+         \nof the polling session?')
+        if (m4=='yes'):
+            saveSession(None, self.studentlist, self.log)
+        # The log stays on disk in case the results were not saved
+        self.log.close()
+
+
+def saveSession(cumresults, studentlist, sessionlog=None):
+    ''' First function of two to save the polling results in a .csv file
+    This one gets the name of the file where results will be saved
+    Then passes cumresults and studentlist to makeSessionCsv to do the
+    actual saving, or has sessionlog write the file if a SessionLog is
+    given. If the latter function returns an error triggers a warning'''
+    # Determine number of questions
+    counter=0
+    while counter==0:
+        namecsvfile=filedialog.asksaveasfilename(defaultextension=".csv") 
+        if namecsvfile=='':
+            m2=messagebox.askquestion(message='No file was selected \
+            \nDo you want to try again?')
+            if m2=='no': 
+                counter=1
+        else:
+            try:
+                if sessionlog is not None:
+                    sessionlog.materialize(namecsvfile)
+                else:
+                    makeSessionCsv(namecsvfile, cumresults, studentlist)
+                counter=1
+                # Display confirmatory message
+                m4=messagebox.showinfo(message='File saved')
+            except:
+                m3=messagebox.showinfo(message='There was a problem with the file\
+                \nPlease try again')    
+    return
+
+
+class ResultsView():
+    ''' Persistent polling results window. The six columns (choices A-E and
+    no choice) are drawn on a Canvas that only holds the rows that fit in
+    the window: a fixed pool of text items, one per visible row and column,
+    is filled with the students at the scroll position on every draw, so
+    drawing costs the same for a section of 40 or of 400 students and the
+    window never grows taller than the screen. Above the columns each
+    header shows the number of students in the column, with a bar for the
+    share of the class that chose it.
+    Each update compares the new organizedresults with what is displayed
+    and only moves the students whose column changed, keeping the order of
+    the others. The text and bars of each column are placed under its
+    header, whose width depends on the font, so they stay lined up at any
+    DPI. closecommand is called when the window is closed '''
+
+    # Size in pixels of a row, and rows shown when the window opens (it can
+    # be resized)
+    rowheight=20
+    visiblerows=25
+    # Characters of a student shown, the rest would spill into the next column
+    maxchars=22
+    headertexts=['Choice A', 'Choice B', 'Choice C', 'Choice D', 'Choice E',
+                 'No Choice']
+
+    def __init__(self, organizedresults, closecommand):
+        self.window=Toplevel(root, bg="gray93", padx=10, pady=10)
+        self.window.title('Polling results')
+
+        # Column headers, with the count of each column. A header is 17
+        # times the width of 0 in its font plus the padding, the width of
+        # the columns until the headers are drawn and can be measured
+        headerfont=tkinter.font.Font(family='Helvetica', size=16)
+        columnwidth=17*headerfont.measure('0')+10
+        self.columnx=[column*columnwidth for column in range(6)]
+        self.columnwidths=[columnwidth]*6
+        self.headers=[]
+        for column, text in enumerate(self.headertexts):
+            header=ttk.Label(self.window, text=text, anchor='center',
+                    font=headerfont, padding=5, width=17)
+            header.grid(column=column, row=0)
+            header.bind('<Configure>', self.placeColumns)
+            self.headers.append(header)
+
+        # Histogram bars, one per column
+        self.bars=Canvas(self.window, bg="gray93", highlightthickness=0,
+                         width=6*columnwidth, height=14)
+        self.bars.grid(column=0, row=1, columnspan=6, sticky=(W, E))
+        self.barids=[self.bars.create_rectangle(0, 2, 0, 12, width=0,
+                                                fill='SteelBlue')
+                     for column in range(6)]
+
+        # Results drawn on a canvas with a scrollbar
+        self.canvas=Canvas(self.window, bg="white", highlightthickness=0,
+                           width=6*columnwidth,
+                           height=self.visiblerows*self.rowheight)
+        self.canvas.grid(column=0, row=2, columnspan=6, sticky=(N, W, E, S))
+        self.scrollbar=ttk.Scrollbar(self.window, orient=VERTICAL,
+                                     command=self.scroll)
+        self.scrollbar.grid(column=6, row=2, sticky=(N, S))
+        self.window.rowconfigure(2, weight=1)
+        self.canvas.bind('<Configure>', self.resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.canvas.bind(sequence, self.wheel)
+
+        # Students shown in each column in order, the column where each
+        # student is shown, the first row on screen, and the text items of
+        # the visible rows with the text they show
+        self.columns=[[] for column in range(6)]
+        self.placement={}
+        self.top=0
+        self.items=[]
+        self.texts=[]
+        self.counts=None
+        self.setRows(self.visiblerows)
+
+        # Add label with the question being displayed
+        self.status=ttk.Label(self.window, anchor='w')
+        self.status.grid(column=0, row=3, columnspan=5, sticky=(W, E))
+        # Add button to close the window
+        closebutton1=ttk.Button(self.window, text='Close',
+                                command=closecommand)
+        closebutton1.grid(column=5, row=3)
+        self.window.protocol('WM_DELETE_WINDOW', closecommand)
+        self.update(organizedresults)
+
+    @timing.timed('render')
+    def update(self, organizedresults):
+        ''' Show organizedresults, moving only the students whose column
+        changed since the last update '''
+        placement, removed, added=organizedChanges(self.placement,
+                                                   organizedresults)
+        for column, items in enumerate(removed):
+            if items:
+                items=set(items)
+                self.columns[column]=[item for item in self.columns[column]
+                                      if item not in items]
+        for column, items in enumerate(added):
+            self.columns[column].extend(items)
+        self.placement=placement
+        self.draw()
+
+    def setRows(self, nrows):
+        ''' Make the pool of text items as large as the rows that fit '''
+        while len(self.items)<nrows:
+            y=len(self.items)*self.rowheight+self.rowheight//2
+            self.items.append([self.canvas.create_text(
+                    self.columnx[column]+6, y, anchor='w', text='')
+                    for column in range(6)])
+            self.texts.append(['']*6)
+        while len(self.items)>nrows:
+            for item in self.items.pop():
+                self.canvas.delete(item)
+            self.texts.pop()
+
+    def draw(self):
+        ''' Fill the visible rows from the scroll position, and update the
+        counts, bars and scrollbar. Only items whose text changed are
+        touched '''
+        nrows=max(len(shown) for shown in self.columns)
+        self.top=max(0, min(self.top, nrows-len(self.items)))
+        for row, rowitems in enumerate(self.items):
+            index=self.top+row
+            texts=self.texts[row]
+            for column, shown in enumerate(self.columns):
+                text=('  '+shown[index][:self.maxchars] if index<len(shown)
+                      else '')
+                if text!=texts[column]:
+                    self.canvas.itemconfigure(rowitems[column], text=text)
+                    texts[column]=text
+        counts=[len(shown) for shown in self.columns]
+        if counts!=self.counts:
+            self.counts=counts
+            total=max(sum(counts), 1)
+            for column, count in enumerate(counts):
+                self.headers[column].configure(text=self.headertexts[column]
+                                               + ' (' + str(count) + ')')
+                left=self.columnx[column]+6
+                self.bars.coords(self.barids[column], left, 2, left+
+                                 (self.columnwidths[column]-12)*count/total,
+                                 12)
+        if nrows:
+            self.scrollbar.set(self.top/nrows,
+                               min(1, (self.top+len(self.items))/nrows))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, action, amount, what=None):
+        ''' Command of the scrollbar '''
+        nrows=max(len(shown) for shown in self.columns)
+        if action=='moveto':
+            self.top=int(float(amount)*nrows)
+        elif what=='pages':
+            self.top+=int(amount)*len(self.items)
+        else:
+            self.top+=int(amount)
+        self.draw()
+
+    def wheel(self, event):
+        if event.num==4 or getattr(event, 'delta', 0)>0:
+            self.scroll('scroll', -3)
+        else:
+            self.scroll('scroll', 3)
+
+    def resize(self, event):
+        ''' Change the number of visible rows to what fits in the canvas '''
+        nrows=max(1, event.height//self.rowheight)
+        if nrows!=len(self.items):
+            self.setRows(nrows)
+            self.draw()
+        self.placeColumns()
+
+    def placeColumns(self, event=None):
+        ''' Move the text items and bars under the headers, called when a
+        header or the canvas changes size '''
+        if self.headers[-1].winfo_width()<=1:
+            # Not drawn yet
+            return
+        origin=self.canvas.winfo_x()
+        columnx=[header.winfo_x()-origin for header in self.headers]
+        widths=[header.winfo_width() for header in self.headers]
+        if columnx==self.columnx and widths==self.columnwidths:
+            return
+        self.columnx=columnx
+        self.columnwidths=widths
+        for row, rowitems in enumerate(self.items):
+            y=row*self.rowheight+self.rowheight//2
+            for column, item in enumerate(rowitems):
+                self.canvas.coords(item, columnx[column]+6, y)
+        # Redraw the bars
+        self.counts=None
+        self.draw()
+
+    def showStatus(self, number, unregistered, summary=None):
+        text='Question ' + str(number) + ', updated ' + time.strftime(
+                '%H:%M:%S')
+        if unregistered:
+            text+=', ' + str(len(unregistered)) + ' unregistered clickers (?)'
+        if summary is not None:
+            text+=', ' + describeTimeline(summary)
+        self.status.configure(text=text)
+
+    def showError(self, error):
+        text=str(error) or type(error).__name__
+        self.status.configure(text='Update failed at ' + time.strftime(
+                '%H:%M:%S') + ': ' + text)
+
+    def destroy(self):
+        self.window.destroy()
+
+
+def getFiles():
+    ''' Gets names of csv and xml files. Reading them is left to loadSession
+    in the background worker '''
+    # Get the file with the iClicker information  
+    m1=messagebox.showinfo(message='Select CSV file with the iClicker \
+    information')  
+    counter=0
+    while counter==0:
+        iclickerfile=filedialog.askopenfilename() #notice all lowercase 
+        if iclickerfile=='':
+            m2=messagebox.askquestion(message='No file was selected \
+            \nDo you want to try again?')
+            if m2=='no': return False #if no then go back to main menu
+        else:
+            counter=1
+    
+    # Get the XML file from current session
+    m1=messagebox.showinfo(message='Select XML file from current iClicker \
+    session')  
+    counter=0
+    while counter==0:
+        sessionfile=filedialog.askopenfilename() #notice all lowercase 
+        if sessionfile=='':
+            m2=messagebox.askquestion(message='No file was selected \
+            \nDo you want to try again?')
+            if m2=='no': return False #if no then go back to main menu
+        else:
+            print(sessionfile, ' selected')            
+            counter=1
+    
+    # return both file names to function dispResults
+    return [iclickerfile, sessionfile]
+
+
+def editiClickerInfo():
+    ''' Is called by edit_info_button. Displays a Toplevel window with two 
+    buttons: One to create a new iClicker information file, the other to
+    edit an existing file. Each button has a function bound that destroys this
+    current Toplevel window and then executes the desired choice'''
+    createoredit=Toplevel(root, bg="gray93", padx=10, pady=10)  
+    createoredit.title('Edit iClicker information')
+    createiclickerfile=ttk.Button(createoredit, text='Create new iClicker file', 
+                            command=createiClickerFile)    
+    createiclickerfile.grid(row=0)
+    editiclickerfile=ttk.Button(createoredit, text='Edit existing iClicker file', 
+                            command=editiClickerFile)    
+    editiclickerfile.grid(row=1)
+    # To control when this window gets closed will use the value of a TKinter
+    # boolean variable
+    global close_this_window
+    close_this_window=BooleanVar(value=False)
+    print('close_this_window value: ',close_this_window.get())
+    if (close_this_window==True): 
+        createoredit.destroy()
+    root.wait_window(createoredit)
+    return
+
+
+def createiClickerFile():
+    ''' Called from editiClickerInfo. Sets the values for the variables
+    iclickerdict (dictionary of iClickerID (keys) and student ID (values)),
+    iclickerfile (csv file where the info for iclicker dict was stored as
+    second and first column respectively - yes the order in the csv file is
+    inverted with respect to the iclickerdict variable), and studentlist (list
+    of student IDs in the same order as user enters them, needed in addition to
+    iclickerdict because dictionaries are not ordered) as empty and passes 
+    those values to iClickerManager, a common interface for both 
+    createiClickerFile and editiClickerFile'''
+    # First change the value of close_this_window so the createoredit Toplevel
+    # is destroyed
+    close_this_window.set(True)    
+    # Initialize the empty variables
+    iclickerdict={}
+    iclickerfile=""
+    studentlist=[]
+    print('createiClickerFile')
+    print('close_this_window value: ',close_this_window.get())
+    return
+
+
+def editiClickerFile():
+    ''' Called from editiClickerInfo. Sets the values for the variables
+    iclickerdict (dictionary of iClickerID (keys) and student ID (values)),
+    iclickerfile (csv file where the info for iclicker dict was stored as
+    second and first column respectively - yes the order in the csv file is
+    inverted with respect to the iclickerdict variable), and studentlist (list
+    of student IDs in the same order as user enters them, needed in addition to
+    iclickerdict because dictionaries are not ordered) using the filebrowser
+    and getiClickerData function. It then passes those values to 
+    iClickerManager, a common interface for both createiClickerFile and 
+    editiClickerFile'''
+    # Initialize the variables
+    # Get the file with the iClicker information  
+    m1=messagebox.showinfo(message='Select CSV file with the iClicker \
+    information')  
+    counter=0
+    while counter==0:
+        iclickerfile=filedialog.askopenfilename() #notice all lowercase 
+        if iclickerfile=='':
+            m2=messagebox.askquestion(message='No file was selected \
+            \nDo you want to try again?')
+            if m2=='no': return #if no then go back to main menu
+        else:
+            # If got a filename extract the data            
+            try:
+                studentlist, iclickerdict=getiClickerData(iclickerfile)
+                counter=1
+            except:
+                m3=messagebox.showinfo(message='There was a problem with the file\
+                \nPlease try again')
+    print('editiClickerFile')            
+    
+    
+    return
+
+
+def batchResults():
+    ''' Is called by batch_button. Gets the names of the csv and xml files,
+    has the worker tally every question in the session file with
+    batchSession and then offers to save the results, so a past session can
+    be saved without stepping through its polls '''
+    gotfiles=getFiles()
+    if (gotfiles==False):
+        return
+    iclickerfile, sessionfile=gotfiles
+    root.configure(cursor='watch')
+    worker.submit(sessionfile, loadBatch, (iclickerfile, sessionfile),
+                  saveBatch, loadFailed)
+    return
+
+
+def loadBatch(iclickerfile, sessionfile):
+    ''' Reads the csv file and every question in the xml file, returns
+    cumresults and studentlist as expected by saveSession. Runs in the
+    background worker '''
+    studentlist, iclickerdict=getiClickerData(iclickerfile)
+    questions=batchSession(sessionfile, iclickerdict)
+    return [sessionResults(iclickerdict, studentlist, questions), studentlist]
+
+
+def saveBatch(loaded):
+    ''' Called by the worker with the output of loadBatch '''
+    root.configure(cursor='')
+    saveSession(*loaded)
+    return
+
+
+class TimingPanel():
+    ''' Is called by timing_button. Displays a Toplevel window with the
+    timing statistics of each stage (parse, tally, render, log, save and the
+    end to end latency from a change in the session file to the results on
+    screen), refreshed every second, with a check button to turn timing on
+    and off and a button to save the statistics in a JSON file '''
+
+    # Milliseconds between refreshes of the statistics
+    refreshinterval=1000
+
+    def __init__(self):
+        self.window=Toplevel(root, bg="gray93", padx=10, pady=10)
+        self.window.title('Timing statistics')
+        self.enabled=BooleanVar(value=timing.enabled)
+        enabledbutton=ttk.Checkbutton(self.window, text='Record timings',
+                                      variable=self.enabled,
+                                      command=self.toggle)
+        enabledbutton.grid(column=0, row=0, sticky=W)
+        self.stats=ttk.Label(self.window, font=("Courier", 11),
+                             justify='left')
+        self.stats.grid(column=0, row=1, columnspan=2, sticky=(W, E))
+        savebutton=ttk.Button(self.window, text='Save as JSON',
+                              command=self.save)
+        savebutton.grid(column=0, row=2, sticky=W)
+        closebutton=ttk.Button(self.window, text='Close',
+                               command=self.window.destroy)
+        closebutton.grid(column=1, row=2, sticky=E)
+        self.refresh()
+
+    def toggle(self):
+        timing.enable(self.enabled.get())
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+        lines=['%-17s %6s %8s %8s %8s' % ('stage (ms)', 'count', 'median',
+                                           'p95', 'max')]
+        for stage, summary in timing.summaries().items():
+            if 'median' not in summary:
+                continue
+            lines.append('%-17s %6d %8.1f %8.1f %8.1f' % (stage,
+                    summary['count'], summary['median'], summary['p95'],
+                    summary['max']))
+            if stage==timing.endtoend and timing.target is not None:
+                lines.append('%-17s %6d over %d ms target' % ('',
+                        summary['overtarget'], timing.target))
+        if len(lines)==1:
+            lines.append('No timings recorded')
+        self.stats.configure(text='\n'.join(lines))
+        self.window.after(self.refreshinterval, self.refresh)
+
+    def save(self):
+        namejsonfile=filedialog.asksaveasfilename(defaultextension=".json")
+        if namejsonfile=='':
+            return
+        try:
+            timing.exportJson(namejsonfile)
+        except OSError:
+            m3=messagebox.showinfo(message='There was a problem with the file\
+            \nPlease try again')
+
+
+def drainWorker():
+    ''' Check the background worker for results every 50 ms, even if one
+    of the callbacks failed '''
+    try:
+        worker.drain(callbackFailed)
+    finally:
+        root.after(50, drainWorker)
+
+
+def callbackFailed(error):
+    ''' Called by drainWorker if the callback of a job raised an error '''
+    traceback.print_exception(type(error), error, error.__traceback__)
+    root.configure(cursor='')
+    m3=messagebox.showinfo(message='There was a problem showing the results\
+            \n' + str(error))
+
+
+def exitFunction():
+    ''' Close program '''
+    root.destroy()
+
+
+def mainMenu(tallybroadcaster=None):
+    ''' Creates the root window with the main menu and runs the Tk main loop.
+    The tallies of live sessions are also published to the viewers of
+    tallybroadcaster if one is given '''
+    global root, worker, broadcaster
+    broadcaster=tallybroadcaster
+    # Create the root window
+    root=Tk()
+    root.title("RealTime ARS")
+
+    # Start the background worker that reads and tallies the files
+    worker=TallyWorker()
+    root.after(50, drainWorker)
+
+    # Create a frame that will contain the main menu
+    mf_mainmenu=ttk.Frame(root, padding='12 12 12 12')
+    mf_mainmenu.grid(column=0, row=0, sticky=(N, W, E, S))
+    mf_mainmenu.columnconfigure(0,weight=1)
+    mf_mainmenu.rowconfigure(0, weight= 1)
+
+    # Add title element
+    title1=ttk.Label(mf_mainmenu, text='RealTime ARS', anchor='center', 
+                     font=("Helvetica", 16))
+    title1.grid(column=2, row=0)
+
+    # Add buttons
+    disp_result_button=ttk.Button(mf_mainmenu, text='Display Session Results',
+                                  command=dispResults1)
+    disp_result_button.grid(column=2, row=1, sticky=(W, E))
+
+    batch_button=ttk.Button(mf_mainmenu, text='Save Past Session Results',
+                            command=batchResults)
+    batch_button.grid(column=2, row=2, sticky=(W, E))
+
+    edit_info_button=ttk.Button(mf_mainmenu, text='Edit iClicker information', 
+                                command=editiClickerInfo)
+    edit_info_button.grid(column=2, row=3, sticky=(W, E))
+
+    timing_button=ttk.Button(mf_mainmenu, text='Timing statistics',
+                             command=TimingPanel)
+    timing_button.grid(column=2, row=4, sticky=(W, E))
+
+    exit_button=ttk.Button(mf_mainmenu, text='Exit', command=exitFunction)
+    exit_button.grid(column=2, row=5, sticky=(W, E))
+
+    # Add footer
+    title2=ttk.Label(mf_mainmenu, text='Version 1.0, 2016', anchor='center')
+    title2.grid(column=2, row=6)
+                     
+    for child in mf_mainmenu.winfo_children():
+        child.grid_configure(padx=5, pady=5)
+            
+    root.mainloop()
+    if broadcaster is not None:
+        broadcaster.close()
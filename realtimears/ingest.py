@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Network ingest of votes from several base stations into one aggregator
+"""
+
+import asyncio
+import json
+import os
+
+from .session import SessionTailReader
+from .tally import getTallyIndex
+
+
+# Largest message accepted from a forwarder, in bytes
+messagelimit=4*1024*1024
+
+
+class VoteAggregator():
+    ''' Merges the votes sent by the forwarders of several base stations.
+    Each forwarder sends the complete current votes of a question of its
+    session file, so a message replaces what that station sent before for
+    that question and resending is harmless. The votes of all stations for
+    a question are merged by time into one pollanswers and tallied with the
+    TallyIndex of iclickerdict, so a clicker that voted in two rooms gets its
+    latest vote, and the answer codes and organizedresults are the ones
+    tallyLatest gives for a session file with all the votes. Every listener
+    is called with the question number, answer codes, organizedresults and
+    unregistered dictionary after each update '''
+
+    def __init__(self, iclickerdict):
+        self.iclickerdict=iclickerdict
+        # Votes of each question by number, and by station within it
+        self.questions={}
+        self.listeners=[]
+
+    def update(self, station, number, pollanswers):
+        ''' Take the votes of question number from station, returns the
+        tally of the question '''
+        self.questions.setdefault(number, {})[station]=pollanswers
+        tallied=self.tally(number)
+        for listener in self.listeners:
+            listener(*tallied)
+        return tallied
+
+    def merged(self, number):
+        ''' pollanswers, with times, of question number with the votes of
+        every station in time order. A vote without a time gets the latest
+        time seen before it in its own station, as tallyTimed does, and votes
+        with the same time keep the name order of their stations '''
+        votes=[]
+        stations=self.questions.get(number, {})
+        for station in sorted(stations):
+            clock=0
+            for vote in zip(*stations[station]):
+                if vote[2] is None:
+                    vote=(vote[0], vote[1], clock)
+                elif vote[2]>clock:
+                    clock=vote[2]
+                votes.append(vote)
+        votes.sort(key=lambda vote: vote[2])
+        if not votes:
+            return [[], [], []]
+        return [list(column) for column in zip(*votes)]
+
+    def tally(self, number):
+        ''' Returns number, answer codes, organizedresults and unregistered
+        dictionary of question number, as tallyLatest does '''
+        tallyindex=getTallyIndex(self.iclickerdict)
+        unregistered={}
+        answers=tallyindex.tally(self.merged(number), unregistered)
+        return (number, answers, tallyindex.organize(answers, unregistered),
+                unregistered)
+
+    def latest(self):
+        ''' Number of the latest question received, None if there is none '''
+        return max(self.questions) if self.questions else None
+
+
+class IngestServer():
+    ''' asyncio TCP server that receives votes from the forwarders. Each
+    message is a line of JSON with the name of the station, the number of
+    the question and its votes as [iClicker ID, answer, seconds] triples,
+    seconds being null for a vote without a time:
+        {"station": "room 1", "question": 3,
+         "votes": [["#0C4A3DFD", "B", 14]]}
+    [iClicker ID, answer] pairs are taken as votes without a time. It is
+    answered with a line {"ok": true, "question": 3}, or with ok
+    false and an error for a message that can't be used. Any number of
+    forwarders can stay connected at the same time '''
+
+    def __init__(self, aggregator, host='127.0.0.1', port=0):
+        self.aggregator=aggregator
+        self.host=host
+        self.port=port
+        self.server=None
+        self.messages=0
+
+    async def start(self):
+        ''' Start listening, port 0 picks a free port which is then stored in
+        self.port '''
+        self.server=await asyncio.start_server(self.handle, self.host,
+                                               self.port, limit=messagelimit)
+        self.port=self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serveForever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        self.server.close()
+
+    async def handle(self, reader, writer):
+        ''' Read the messages of one forwarder until it disconnects '''
+        try:
+            while True:
+                try:
+                    line=await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    reply={'ok': False, 'error': 'message too long'}
+                    writer.write(json.dumps(reply).encode()+b'\n')
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(self.receive(line)).encode()+b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def receive(self, line):
+        ''' Apply one message, returns the reply '''
+        try:
+            message=json.loads(line)
+            station=str(message['station'])
+            number=int(message['question'])
+            studentid=[]
+            answerchoice=[]
+            votetime=[]
+            for iclickerid, answer, *seconds in message['votes']:
+                studentid.append(str(iclickerid))
+                answerchoice.append(str(answer))
+                if len(seconds)>1:
+                    raise ValueError('vote with more than three values')
+                if seconds and seconds[0] is not None:
+                    votetime.append(int(seconds[0]))
+                else:
+                    votetime.append(None)
+        except (ValueError, KeyError, TypeError) as error:
+            return {'ok': False, 'error': 'bad message: ' + str(error)}
+        self.messages+=1
+        self.aggregator.update(station, number,
+                               [studentid, answerchoice, votetime])
+        return {'ok': True, 'question': number}
+
+
+class Forwarder():
+    ''' Client of the IngestServer for one base station. send takes the
+    pollanswers of a question, with the times of the votes as
+    parseVoteBlock returns them, and waits for the server to acknowledge it,
+    connecting (again) when needed '''
+
+    def __init__(self, station, host, port):
+        self.station=station
+        self.host=host
+        self.port=port
+        self.reader=None
+        self.writer=None
+
+    async def connect(self):
+        self.reader, self.writer=await asyncio.open_connection(
+                self.host, self.port, limit=messagelimit)
+
+    async def send(self, number, pollanswers):
+        if self.writer is None:
+            await self.connect()
+        message={'station': self.station, 'question': number,
+                 'votes': list(zip(*pollanswers[:3]))}
+        try:
+            self.writer.write(json.dumps(message).encode()+b'\n')
+            await self.writer.drain()
+            reply=await self.reader.readline()
+        except ConnectionError:
+            reply=b''
+        if not reply:
+            await self.close()
+            raise ConnectionError('The ingest server closed the connection')
+        reply=json.loads(reply)
+        if not reply['ok']:
+            raise ValueError(reply['error'])
+        return reply
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader=None
+        self.writer=None
+
+
+def describeTally(number, answers, organizedresults, unregistered):
+    ''' One line summary of a tally, for the serve command '''
+    counts=[len(sublist) for sublist in organizedresults]
+    text=('Question ' + str(number) + ': ' + ', '.join(
+            letter + ' ' + str(count) for letter, count
+            in zip(['A', 'B', 'C', 'D', 'E', 'No Choice'], counts)))
+    if unregistered:
+        text+=' (' + str(len(unregistered)) + ' unregistered)'
+    return text
+
+
+async def forwardSession(sessionfile, station, host, port, interval=0.5,
+                         stop=None):
+    ''' Tails a local session file with a SessionTailReader and sends each
+    question to the ingest server: every question once when starting, and
+    then the latest question (and any new one) whenever the size or
+    modification time of the file changes. Runs until the stop event is set,
+    retrying after connection errors '''
+    forwarder=Forwarder(station, host, port)
+    reader=SessionTailReader(sessionfile)
+    stop=stop or asyncio.Event()
+    laststat=None
+    sent=0
+    while not stop.is_set():
+        try:
+            stat=os.stat(sessionfile)
+            current=(stat.st_size, stat.st_mtime_ns)
+            if current!=laststat:
+                blocks=reader.refresh()
+                # Resend the last question sent, it may have new votes
+                for number in range(max(sent, 1), len(blocks)+1):
+                    await forwarder.send(number, blocks[number-1])
+                sent=len(blocks)
+                laststat=current
+        except (OSError, ValueError, SyntaxError):
+            # File being replaced or server not reachable, try again later
+            await forwarder.close()
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+    await forwarder.close()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary archive of the votes of a session, read through mmap
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .session import sessionBlocks
+from .tally import answercodes, answerletters
+
+
+# File layout, all numbers little endian:
+#   header: magic, version, bytes per clicker code, number of clickers,
+#           questions and votes, and the offset of each section
+#   clickeroffsets: uint32 per clicker plus one, where each ID starts in
+#                   clickerids
+#   clickerids: the iClicker IDs in UTF-8, one after the other
+#   questions: uint32 per question plus one, index of its first vote
+#   codes: clicker code (index in the dictionary of IDs) of each vote, 2 or
+#          4 bytes
+#   answers: one byte per vote, the answer code of TallyIndex (0 for no
+#            choice or an answer that is not A-E)
+#   times: uint16 per vote, seconds from the start of the poll (notime if
+#          the base did not record it)
+#   postingoffsets, postings: for each clicker code the sorted indices of
+#                             its votes, uint32, so the votes of a clicker
+#                             are found without reading the others
+packedmagic=b'RTARS\x00\x00\x01'
+packedversion=1
+sections=['clickeroffsets', 'clickerids', 'questions', 'codes', 'answers',
+          'times', 'postingoffsets', 'postings']
+headerformat='<8sHHIII' + 'Q'*len(sections)
+notime=0xFFFF
+# Sections start at multiples of 8 bytes
+alignment=8
+
+
+def packedSessionFile(sessionfile, outdir=None):
+    ''' Name of the packed archive of a session file: the same name with the
+    .rtars extension, next to it or in outdir '''
+    name=os.path.splitext(os.path.basename(sessionfile))[0] + '.rtars'
+    return os.path.join(outdir or os.path.dirname(sessionfile), name)
+
+
+def littleEndian(values):
+    ''' Bytes of an array in little endian order '''
+    if sys.byteorder!='little':
+        values=array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def writePackedSession(packedfile, blocks):
+    ''' Saves the blocks of a session (lists of iClicker IDs, answers and
+    optionally times, as returned by sessionBlocks) in a packed archive.
+    The file is written under a temporary name and then renamed, so a reader
+    never sees half of it '''
+    clickercodes={}
+    questions=array('I', [0])
+    answers=bytearray()
+    times=array('H')
+    codelist=[]
+    for block in blocks:
+        votetime=block[2] if len(block)>2 else [None]*len(block[0])
+        for iclickerid, answer, seconds in zip(block[0], block[1], votetime):
+            code=clickercodes.setdefault(iclickerid, len(clickercodes))
+            codelist.append(code)
+            answers.append(answercodes.get(answer, 0))
+            times.append(notime if seconds is None else
+                         min(max(seconds, 0), notime-1))
+        questions.append(len(codelist))
+    codewidth=2 if len(clickercodes)<=0x10000 else 4
+    codes=array('H' if codewidth==2 else 'I', codelist)
+    # Postings of each clicker, in vote order
+    postinglists=[[] for code in range(len(clickercodes))]
+    for position, code in enumerate(codelist):
+        postinglists[code].append(position)
+    postingoffsets=array('I', [0])
+    postings=array('I')
+    for positions in postinglists:
+        postings.extend(positions)
+        postingoffsets.append(len(postings))
+    encoded=[iclickerid.encode() for iclickerid in clickercodes]
+    clickeroffsets=array('I', [0])
+    for iclickerid in encoded:
+        clickeroffsets.append(clickeroffsets[-1]+len(iclickerid))
+    contents=[littleEndian(clickeroffsets), b''.join(encoded),
+              littleEndian(questions), littleEndian(codes), bytes(answers),
+              littleEndian(times), littleEndian(postingoffsets),
+              littleEndian(postings)]
+    offsets=[]
+    position=struct.calcsize(headerformat)
+    for content in contents:
+        position+=-position % alignment
+        offsets.append(position)
+        position+=len(content)
+    header=struct.pack(headerformat, packedmagic, packedversion, codewidth,
+                       len(clickercodes), len(questions)-1, len(codelist),
+                       *offsets)
+    temporary=packedfile + '.tmp'
+    with open(temporary, 'wb') as outfile:
+        outfile.write(header)
+        for offset, content in zip(offsets, contents):
+            outfile.write(b'\x00'*(offset-outfile.tell()))
+            outfile.write(content)
+    os.replace(temporary, packedfile)
+    return packedfile
+
+
+def packSession(sessionfile, packedfile=None):
+    ''' Converts a session xml file to a packed archive, next to it unless
+    packedfile is given. Returns the name of the packed file '''
+    return writePackedSession(packedfile or packedSessionFile(sessionfile),
+                              sessionBlocks(sessionfile))
+
+
+class PackedSession():
+    ''' Reader of a packed archive. The file is mapped in memory and its
+    sections are used in place as memoryviews, so opening it reads only the
+    header and the dictionary of iClicker IDs, and a question or the votes
+    of a clicker are found through the indices without touching the rest.
+    Questions are numbered from 1 as in the results window. Can be used as
+    a context manager, the views returned by questionCodes must be dropped
+    before it is closed '''
+
+    def __init__(self, packedfile):
+        self.packedfile=packedfile
+        with open(packedfile, 'rb') as infile:
+            self.map=mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view=memoryview(self.map)
+        size=struct.calcsize(headerformat)
+        if len(self.view)<size:
+            self.close()
+            raise ValueError(packedfile + ' is not a packed session')
+        header=struct.unpack_from(headerformat, self.view)
+        (magic, version, self.codewidth, self.nclickers, self.nquestions,
+         self.nvotes)=header[:6]
+        if magic!=packedmagic or version!=packedversion:
+            self.close()
+            raise ValueError(packedfile + ' is not a packed session')
+        offsets=dict(zip(sections, header[6:]))
+        lengths={'clickeroffsets': self.nclickers+1, 'clickerids': None,
+                 'questions': self.nquestions+1, 'codes': self.nvotes,
+                 'answers': self.nvotes, 'times': self.nvotes,
+                 'postingoffsets': self.nclickers+1,
+                 'postings': self.nvotes}
+        typecodes={'clickeroffsets': 'I', 'questions': 'I',
+                   'codes': 'H' if self.codewidth==2 else 'I',
+                   'answers': 'B', 'times': 'H', 'postingoffsets': 'I',
+                   'postings': 'I'}
+        self.sections={}
+        for name in sections:
+            if name=='clickerids':
+                continue
+            self.sections[name]=self.section(offsets[name], lengths[name],
+                                             typecodes[name])
+        clickeroffsets=self.sections['clickeroffsets']
+        start=offsets['clickerids']
+        blob=bytes(self.view[start:start+clickeroffsets[-1]])
+        self.clickers=[blob[clickeroffsets[i]:clickeroffsets[i+1]].decode()
+                       for i in range(self.nclickers)]
+        self.clickercode={iclickerid: code for code, iclickerid
+                          in enumerate(self.clickers)}
+
+    def section(self, offset, count, typecode):
+        ''' View of count items of typecode at offset, a copy in native
+        order on big endian machines '''
+        itemsize=array(typecode).itemsize
+        view=self.view[offset:offset+count*itemsize]
+        if len(view)!=count*itemsize:
+            raise ValueError(self.packedfile + ' is truncated')
+        if sys.byteorder!='little' and itemsize>1:
+            values=array(typecode, bytes(view))
+            values.byteswap()
+            return values
+        return view.cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.nquestions
+
+    def close(self):
+        for view in getattr(self, 'sections', {}).values():
+            if isinstance(view, memoryview):
+                view.release()
+        self.sections={}
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # A view is still in use, the map is closed when it is dropped
+            pass
+
+    def voteRange(self, number):
+        ''' Index of the first vote of question number and of the one after
+        its last vote '''
+        if not 1<=number<=self.nquestions:
+            raise IndexError('question ' + str(number) + ' is not in ' +
+                             self.packedfile)
+        questions=self.sections['questions']
+        return questions[number-1], questions[number]
+
+    def questionCodes(self, number):
+        ''' Views of the clicker codes, answer codes and times of the votes
+        of question number, without copying '''
+        start, end=self.voteRange(number)
+        return (self.sections['codes'][start:end],
+                self.sections['answers'][start:end],
+                self.sections['times'][start:end])
+
+    def question(self, number):
+        ''' pollanswers of question number: lists of iClicker IDs, answers
+        and times as parseVoteBlock returns them. Answers that were not
+        A-E come back as empty strings '''
+        codes, answers, times=self.questionCodes(number)
+        clickers=self.clickers
+        return [[clickers[code] for code in codes],
+                [answerletters[answer] for answer in answers],
+                [None if seconds==notime else seconds for seconds in times]]
+
+    def blocks(self):
+        ''' pollanswers of every question, like sessionBlocks '''
+        return [self.question(number+1) for number in range(self.nquestions)]
+
+    def tally(self, number, tallyindex):
+        ''' Answer codes of question number for the students of tallyindex,
+        as TallyIndex.tally: the latest vote of each clicker wins and
+        clickers not in the roster are left out '''
+        codes, answers, times=self.questionCodes(number)
+        clickerindex=tallyindex.clickerindex
+        students=[clickerindex.get(iclickerid) for iclickerid in self.clickers]
+        result=bytearray(len(tallyindex.students))
+        if all(seconds==notime for seconds in times):
+            for code, answer in zip(codes, answers):
+                index=students[code]
+                if index is not None:
+                    result[index]=answer
+            return result
+        kept=[None]*len(result)
+        clock=0
+        for code, answer, seconds in zip(codes, answers, times):
+            if seconds==notime:
+                seconds=clock
+            elif seconds>clock:
+                clock=seconds
+            index=students[code]
+            if index is not None and (kept[index] is None or
+                                      seconds>=kept[index]):
+                result[index]=answer
+                kept[index]=seconds
+        return result
+
+    def voteTime(self, position):
+        ''' Time of the vote at position as TallyIndex.tally counts it: a
+        vote without a time is taken as cast at the latest time of the votes
+        before it in its question '''
+        times=self.sections['times']
+        if times[position]!=notime:
+            return times[position]
+        questions=self.sections['questions']
+        start=questions[bisect.bisect_right(questions, position)-1]
+        return max((seconds for seconds in times[start:position]
+                    if seconds!=notime), default=0)
+
+    def votesOf(self, iclickerids):
+        ''' Sorted indices of the votes of the given iClicker IDs '''
+        postingoffsets=self.sections['postingoffsets']
+        postings=self.sections['postings']
+        positions=[]
+        for iclickerid in iclickerids:
+            code=self.clickercode.get(iclickerid)
+            if code is not None:
+                positions.extend(postings[postingoffsets[code]:
+                                          postingoffsets[code+1]])
+        positions.sort()
+        return positions
+
+    def history(self, iclickerids):
+        ''' Answer letter of each question for a student with the given
+        iClicker IDs (Roster.clickersOf), empty where the student did not
+        answer. Only the votes of those clickers are read '''
+        questions=self.sections['questions']
+        answers=self.sections['answers']
+        kept=[None]*self.nquestions
+        # Position of the vote kept in each question, the latest one wins as
+        # in tally
+        for position in self.votesOf(iclickerids):
+            number=bisect.bisect_right(questions, position)-1
+            if (kept[number] is None or
+                    self.voteTime(position)>=self.voteTime(kept[number])):
+                kept[number]=position
+        return ['' if position is None else answerletters[answers[position]]
+                for position in kept]
+
+
+def sessionHistory(packedfiles, iclickerids):
+    ''' Answers of a student with the given iClicker IDs to every question of
+    several packed sessions, as one list in the order of packedfiles '''
+    letters=[]
+    for packedfile in packedfiles:
+        with PackedSession(packedfile) as packed:
+            letters.extend(packed.history(iclickerids))
+    return letters
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Reading of the csv file with the student ID and iClicker ID of each
+audience member
+"""
+
+import csv
+
+
+def getiClickerData(iclickerfile):
+    ''' Receives name of csv file and returns a dictionary of iClickerID (keys)
+    and student ID (values) and a list of student ID in same order as in the
+    original file. The latter to be used when saving session results'''
+    roster=loadRoster(iclickerfile)
+    return roster.studentlist, roster.iclickerdict
+
+
+def loadRoster(iclickerfile):
+    ''' Receives name of csv file, with the student ID in the first column
+    and the iClicker ID in the second column of each row, and returns its
+    Roster'''
+    with open(iclickerfile, newline='') as csvfile:
+        document=csv.reader(csvfile, delimiter=',', quotechar='|')
+        return Roster(document)
+
+
+class Roster():
+    ''' Students and iClicker IDs of a class. Built from the rows of the csv
+    file, keeps the ordered studentlist and the iclickerdict of iClicker ID
+    (keys) and student ID (values) used everywhere else, plus the reverse
+    clickers dictionary of student ID (keys) and the list of their iClicker
+    IDs (values), so lookups both ways are dictionary lookups.
+    iClicker IDs registered more than once are kept in duplicates, with the
+    list of student IDs they were registered to; as with the plain
+    dictionary the last row wins. Rows without both columns raise a
+    ValueError with the row number, blank rows are skipped '''
+
+    def __init__(self, rows):
+        self.studentlist=[]
+        self.iclickerdict={}
+        self.clickers={}
+        self.duplicates={}
+        for number, row in enumerate(rows):
+            if not row or not any(row):
+                continue
+            if len(row)<2:
+                raise ValueError('Row ' + str(number+1) + ' of the iClicker '
+                                 'file has no iClicker ID')
+            studentid, iclickerid=row[0], row[1]
+            self.studentlist.append(studentid)
+            previous=self.iclickerdict.get(iclickerid)
+            if previous is not None:
+                self.duplicates.setdefault(iclickerid, [previous]).append(
+                        studentid)
+                self.clickers[previous].remove(iclickerid)
+            self.iclickerdict[iclickerid]=studentid
+            self.clickers.setdefault(studentid, []).append(iclickerid)
+
+    def __len__(self):
+        return len(self.studentlist)
+
+    def student(self, iclickerid):
+        ''' Student ID of an iClicker ID, None if it is not registered '''
+        return self.iclickerdict.get(iclickerid)
+
+    def clickersOf(self, studentid):
+        ''' List of iClicker IDs registered to a student '''
+        return self.clickers.get(studentid, [])
+
+    def validate(self, iclickerids):
+        ''' Checks a sequence of iClicker IDs, like the first list of
+        pollanswers, in one pass and returns those not in the roster, each
+        once and in order of appearance '''
+        iclickerdict=self.iclickerdict
+        return [iclickerid for iclickerid in dict.fromkeys(iclickerids)
+                if iclickerid not in iclickerdict]
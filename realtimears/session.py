@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Reading of the XML file in which the iClicker base saves the responses of
+a polling session
+"""
+
+import os
+import re
+try:
+    import xml.etree.cElementTree as etree
+except ImportError:
+    # cElementTree was removed in Python 3.9, ElementTree uses the C
+    # accelerator automatically
+    import xml.etree.ElementTree as etree
+
+from .cache import parsecache
+from .timing import timed
+
+
+def getPollResults(sessionfile):
+    ''' Receives name of xml file and returns paired lists of students ID and
+    answer choice for the last <p>...</p> question block. The file is read
+    through a SessionTailReader kept for each session file, so on repeated
+    calls only the bytes appended since the previous call are parsed. The
+    times of the answers are in the blocks of refreshSession '''
+    blocks=refreshSession(sessionfile)
+    if len(blocks)==0 or len(blocks[0][0])==0:
+        return #Might not be iclicker file, go back to getFiles, trigger error
+    # Return copies so callers can't alter the cached state of the reader
+    pollanswers=[list(blocks[-1][0]), list(blocks[-1][1])]
+    return pollanswers
+
+
+@timed('parse')
+def refreshSession(sessionfile):
+    ''' Reads what was added to the xml file since the last call and returns
+    the blocks of its SessionTailReader, as parseVoteBlock returns them. The
+    blocks belong to the reader and must not be changed '''
+    reader=sessionreaders.get(sessionfile)
+    if reader is None:
+        reader=openSessionReader(sessionfile)
+        sessionreaders[sessionfile]=reader
+    return reader.refresh()
+
+
+def openSessionReader(sessionfile):
+    ''' Creates the SessionTailReader of a session file. If the parse cache
+    holds the blocks of the current version of the file the reader starts
+    from them, otherwise the file is read in full and the blocks are stored
+    in the cache for the next time the session is opened '''
+    reader=SessionTailReader(sessionfile)
+    key=parsecache.fileKey(sessionfile)
+    blocks=parsecache.get(sessionfile, sessionkind, key)
+    if blocks is not None and reader.seed(blocks):
+        return reader
+    parsecache.put(sessionfile, sessionkind, key, reader.refresh())
+    return reader
+
+
+def parseQuestionBlock(element):
+    ''' Receives a <p>...</p> element and returns paired lists of students ID
+    and answer choice for each of the <v> answers it contains '''
+    return parseVoteBlock(element)[:2]
+
+
+def parseVoteBlock(element):
+    ''' Like parseQuestionBlock, plus a third list with the time of each
+    answer in seconds from the start of the poll (None if the base did not
+    record it) '''
+    # declare variables to store students ID, answer choice and time
+    studentid=[]
+    answerchoice=[]
+    votetime=[]
+    # Iterate through each of the iClicker answers submitted in a question
+    for child in element.iterfind('v'):
+        # For each answer extract student ID and choice made and append them to
+        # storing variables
+        studentid.append(child.attrib['id'])
+        answerchoice.append(child.attrib['ans'])
+        votetime.append(voteSeconds(child.attrib.get('tm')))
+    return [studentid, answerchoice, votetime]
+
+
+def voteSeconds(text):
+    ''' Seconds in a tm attribute of HH:MM:SS or MM:SS, None if missing or
+    not a time '''
+    if not text:
+        return None
+    seconds=0
+    try:
+        for part in text.split(':'):
+            seconds=seconds*60+int(part)
+    except ValueError:
+        return None
+    return seconds
+
+
+def iterSessionBlocks(sessionfile):
+    ''' Reads the <p>...</p> question blocks of the session file in a single
+    streaming pass with iterparse and yields the lists of students ID,
+    answer choice and time of each one, as parseVoteBlock returns them. Each
+    block is dropped from the tree once read, so memory does not grow with
+    the size of the file '''
+    xmlroot=None
+    for event, element in etree.iterparse(sessionfile,
+                                          events=('start', 'end')):
+        if xmlroot is None:
+            xmlroot=element
+        elif event=='end' and element.tag=='p':
+            block=parseVoteBlock(element)
+            # Question blocks are children of the root, drop the ones done
+            xmlroot.clear()
+            yield block
+
+
+@timed('parse')
+def sessionBlocks(sessionfile):
+    ''' Returns the lists of students ID, answer choice and time of every
+    question in the session file, as parseVoteBlock returns them '''
+    return list(iterSessionBlocks(sessionfile))
+
+
+# Readers of the session files opened so far, by file name
+sessionreaders={}
+# Kind of the session entries in the parse cache, changed with the format of
+# the blocks so entries saved by older versions are not used
+sessionkind='session-times'
+# Complete <p>...</p> (or empty <p/>) question blocks in the raw XML bytes
+questionblock=re.compile(rb'<p\b[^>]*?(?:/>|>.*?</p\s*>)', re.S)
+xmldeclaration=re.compile(rb'<\?xml[^>]*\?>')
+
+
+class SessionTailReader():
+    ''' Incremental reader of the XML file where the iClicker base saves the
+    current polling session. The base appends a new <p>...</p> block for each
+    question and rewrites the closing tag of the root element, so the reader
+    keeps the parsed answers of all complete blocks together with the byte
+    offset where the last one starts. Each refresh reads only from that offset
+    on: the last block is parsed again (the base might still be adding votes)
+    and any block appended after it is parsed for the first time. If the
+    file shrinks or its beginning changes the file was replaced and it is
+    read again from the start '''
+
+    # Number of bytes at the start of the file used to detect that the file
+    # was replaced
+    checklength=256
+
+    def __init__(self, sessionfile):
+        self.sessionfile=sessionfile
+        self.reset()
+
+    def reset(self):
+        ''' Forget everything read so far '''
+        # List of [studentid, answerchoice, votetime] lists, one per question
+        # block
+        self.blocks=[]
+        # Byte offset of the start of the last complete block
+        self.offset=0
+        self.head=b''
+        self.declaration=b''
+
+    def seed(self, blocks):
+        ''' Start from blocks parsed earlier from the current content of the
+        file (by the parse cache), so only the last block has to be parsed
+        again on the next refresh. Returns False if the file doesn't match
+        the blocks '''
+        self.reset()
+        with open(self.sessionfile, 'rb') as xmlfile:
+            data=xmlfile.read()
+        # Find where the last complete block starts
+        start=data.rfind(b'<p')
+        while start>=0 and not questionblock.match(data, start):
+            start=data.rfind(b'<p', 0, start)
+        if start<0 or len(blocks)==0:
+            return False
+        self.head=data[:self.checklength]
+        match=xmldeclaration.match(data.lstrip())
+        if match:
+            self.declaration=match.group(0)
+        self.blocks=list(blocks)
+        self.offset=start
+        return True
+
+    def refresh(self):
+        ''' Parse whatever was added to the file since the last refresh and
+        return the list of blocks read so far '''
+        with open(self.sessionfile, 'rb') as xmlfile:
+            if self.blocks and not self._unchanged(xmlfile):
+                self.reset()
+            xmlfile.seek(self.offset)
+            tail=xmlfile.read()
+        if self.offset==0:
+            self.head=tail[:self.checklength]
+            match=xmldeclaration.match(tail.lstrip())
+            if match:
+                self.declaration=match.group(0)
+        newblocks=[]
+        laststart=None
+        for match in questionblock.finditer(tail):
+            element=etree.fromstring(self.declaration+match.group(0))
+            newblocks.append(parseVoteBlock(element))
+            laststart=match.start()
+        # A half written last block is not matched, keep the previous
+        # version of that block until the base finishes writing it
+        if laststart is None:
+            return self.blocks
+        if self.offset>0:
+            # The block at the old offset was parsed again
+            del self.blocks[-1]
+        self.blocks.extend(newblocks)
+        self.offset+=laststart
+        return self.blocks
+
+    def _unchanged(self, xmlfile):
+        ''' Check that the start of the file is still the same and that the
+        last block read still starts at the same offset, meaning new data was
+        only appended. The start tag of the last block itself is not compared
+        because the base fills in its attributes when the poll is closed '''
+        if os.fstat(xmlfile.fileno()).st_size<self.offset+2:
+            return False
+        if xmlfile.read(len(self.head))!=self.head:
+            return False
+        xmlfile.seek(self.offset)
+        return xmlfile.read(2)==b'<p'
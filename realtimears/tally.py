@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Tallying of the answers of each question by student
+"""
+
+import hashlib
+import itertools
+import threading
+
+from .cache import parsecache
+from .session import iterSessionBlocks, refreshSession
+from .timing import timed, timer
+
+
+@timed('tally')
+def organizedResults(iclickerdict, pollanswers):
+    ''' Takes iclickerdict and pollanswers and will return two objects: 
+    First, a dictionary of student ID as key and as value a list
+    of all the answer choices that student has picked in chronological order.
+    Second, a lost of lists with six sublists: the iClicker ID of those that 
+    chose options A-E, and those that did not make any choice. iClicker IDs
+    not in iclickerdict are shown in the sublists as unregistered.
+    The tallying is done by the TallyIndex of iclickerdict '''
+    tallyindex=getTallyIndex(iclickerdict)
+    unregistered={}
+    answers=tallyindex.tally(pollanswers, unregistered)
+    cumresults=tallyindex.cumulativeResults(answers)
+    organizedresults=tallyindex.organize(answers, unregistered)
+    return cumresults, organizedresults
+
+
+def tallyLatest(sessionfile, iclickerdict):
+    ''' Reads the new answers in the xml file and tallies the latest question.
+    Returns the number of the question, its bytearray of answer codes from
+    TallyIndex.tally, the organizedresults to display and the dictionary of
+    unregistered iClicker IDs that answered '''
+    blocks=refreshSession(sessionfile)
+    if len(blocks)==0 or len(blocks[0][0])==0:
+        raise ValueError(sessionfile + ' has no answers')
+    with timer('tally'):
+        tallyindex=getTallyIndex(iclickerdict)
+        unregistered={}
+        answers=tallyindex.tally(blocks[-1], unregistered)
+        organizedresults=tallyindex.organize(answers, unregistered)
+    return len(blocks), answers, organizedresults, unregistered
+
+
+def batchSession(sessionfile, iclickerdict):
+    ''' Reads every <p>...</p> question block of the session file in a single
+    streaming pass with iterparse and returns a list with the bytearray of
+    answer codes of each question, as returned by TallyIndex.tally. Each
+    block is tallied and discarded as soon as it is read, so memory does not
+    grow with the size of the XML tree. The answer codes are kept in the
+    parse cache for the roster, so a session that was already processed
+    with it is not parsed again '''
+    tallyindex=getTallyIndex(iclickerdict)
+    kind='answers-' + tallyindex.digest()
+    key=parsecache.fileKey(sessionfile)
+    questions=parsecache.get(sessionfile, kind, key)
+    if questions is not None:
+        return [bytearray(answers) for answers in questions]
+    questions=[tallyindex.tally(block)
+               for block in iterSessionBlocks(sessionfile)]
+    parsecache.put(sessionfile, kind, key,
+                   [bytes(answers) for answers in questions])
+    return questions
+
+
+def organizedChanges(placement, organizedresults):
+    ''' Compares the organizedresults of a question with the placement of the
+    previous ones, a dictionary of student as key and column of
+    organizedresults as value. Returns the placement of organizedresults
+    and two lists of six sublists: the students that left each column and
+    the students that arrived to each column, in the order they come in
+    organizedresults '''
+    newplacement={}
+    for column, sublist in enumerate(organizedresults):
+        for item in sublist:
+            newplacement[item]=column
+    removed=[[] for column in range(6)]
+    for item, column in placement.items():
+        if newplacement.get(item)!=column:
+            removed[column].append(item)
+    added=[list(dict.fromkeys(item for item in sublist
+                              if placement.get(item)!=column))
+           for column, sublist in enumerate(organizedresults)]
+    return newplacement, removed, added
+
+
+def sessionResults(iclickerdict, studentlist, questions):
+    ''' Put together the answers of all questions in the format expected
+    by makeSessionCsv: a dictionary of student ID as key and a list with the
+    answer to each question, as a one element list, as value. questions is a
+    list with the bytearray of answer codes of each question '''
+    tallyindex=getTallyIndex(iclickerdict)
+    cumresults={studentid: [] for studentid in studentlist}
+    for answers in questions:
+        for studentid in studentlist:
+            cumresults[studentid].append(
+                    [tallyindex.answerOf(answers, studentid)])
+    return cumresults
+
+
+# Answer codes used by TallyIndex, 0 stands for no choice
+answercodes={'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5}
+answerletters=['', 'A', 'B', 'C', 'D', 'E']
+# Columns of organizedresults in code order: no choice goes last
+columncodes=[1, 2, 3, 4, 5, 0]
+# bytes.translate tables that turn an array of answer codes into an array
+# of 1 (code matches) and 0 (code does not match), one table per code
+selecttables=[bytes(int(value==code) for value in range(256))
+              for code in range(6)]
+# Last roster passed to getTallyIndex and its TallyIndex, as one pair so
+# they always go together, and the lock that guards it: the Tk main loop
+# and the background worker both call getTallyIndex
+lasttallyindex=[(None, None)]
+tallyindexlock=threading.Lock()
+
+
+def getTallyIndex(iclickerdict):
+    ''' Returns the TallyIndex of iclickerdict, the index is built only once
+    for as long as the same roster keeps being used '''
+    with tallyindexlock:
+        roster, tallyindex=lasttallyindex[0]
+        if (roster is not iclickerdict or
+                len(tallyindex.clickerindex)!=len(iclickerdict)):
+            tallyindex=TallyIndex(iclickerdict)
+            lasttallyindex[0]=(iclickerdict, tallyindex)
+        return tallyindex
+
+
+class TallyIndex():
+    ''' Maps the iClicker IDs and students of a roster to dense integer
+    indices, so the answers to a question can be stored as a bytearray with
+    one answer code per student (in the order students appear in the
+    roster). Counts and the members of each choice are then computed with
+    bytearray.count, bytes.translate and itertools.compress, which work on
+    the whole array at once instead of looping in Python '''
+
+    def __init__(self, iclickerdict):
+        # Students in roster order, each one only once
+        self.students=list(dict.fromkeys(iclickerdict.values()))
+        self.studentindex={studentid: index for index, studentid
+                           in enumerate(self.students)}
+        self.clickerindex={iclickerid: self.studentindex[studentid]
+                           for iclickerid, studentid in iclickerdict.items()}
+
+    def digest(self):
+        ''' Hash of the students and clickers of the index, which identifies
+        the answer codes it gives in the parse cache '''
+        content=repr([self.students, list(self.clickerindex.items())])
+        return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+    def tally(self, pollanswers, unregistered=None):
+        ''' Takes pollanswers and returns the bytearray of answer codes. If
+        a clicker voted more than once in the question its latest vote is
+        kept: the one with the latest time when pollanswers has the times of
+        the votes (as parseVoteBlock returns them), the last one in the file
+        otherwise. This is the rule of QuestionTimeline, so both give the
+        same answers. Votes of iClicker IDs that are not in the roster are
+        left out, and put in the unregistered dictionary (iClicker ID as key
+        and answer as value) if one is given '''
+        votetime=pollanswers[2] if len(pollanswers)>2 else None
+        if votetime and any(seconds is not None for seconds in votetime):
+            return self.tallyTimed(pollanswers, unregistered)
+        answers=bytearray(len(self.students))
+        clickerindex=self.clickerindex
+        for iclickerid, answer in zip(pollanswers[0], pollanswers[1]):
+            index=clickerindex.get(iclickerid)
+            if index is None:
+                if unregistered is not None:
+                    unregistered[iclickerid]=answer
+                continue
+            answers[index]=answercodes.get(answer, 0)
+        return answers
+
+    def tallyTimed(self, pollanswers, unregistered=None):
+        ''' tally of votes with times. A vote without a time counts as cast
+        at the latest time seen before it, and of two votes with the same
+        time the later one in the file wins '''
+        answers=bytearray(len(self.students))
+        kept=[None]*len(self.students)
+        keptunregistered={}
+        clock=0
+        clickerindex=self.clickerindex
+        for iclickerid, answer, seconds in zip(*pollanswers[:3]):
+            if seconds is None:
+                seconds=clock
+            elif seconds>clock:
+                clock=seconds
+            index=clickerindex.get(iclickerid)
+            if index is None:
+                if (unregistered is not None and
+                        seconds>=keptunregistered.get(iclickerid, seconds)):
+                    unregistered[iclickerid]=answer
+                    keptunregistered[iclickerid]=seconds
+                continue
+            if kept[index] is None or seconds>=kept[index]:
+                answers[index]=answercodes.get(answer, 0)
+                kept[index]=seconds
+        return answers
+
+    def counts(self, answers):
+        ''' Number of students that chose options A-E and no choice '''
+        return [answers.count(code) for code in columncodes]
+
+    def members(self, answers, code):
+        ''' List of students whose answer has the given code '''
+        return list(itertools.compress(self.students,
+                                       answers.translate(selecttables[code])))
+
+    def organize(self, answers, unregistered=None):
+        ''' List of lists with six sublists: the students that chose options
+        A-E and those that did not make any choice. The iClicker IDs in the
+        unregistered dictionary from tally are added at the end of the
+        sublist of their answer, marked with a question mark '''
+        organizedresults=[self.members(answers, code) for code in columncodes]
+        if unregistered:
+            for iclickerid, answer in unregistered.items():
+                column=columncodes.index(answercodes.get(answer, 0))
+                organizedresults[column].append('? '+iclickerid)
+        return organizedresults
+
+    def cumulativeResults(self, answers):
+        ''' Dictionary of student ID as key and as value the answer chosen as
+        a one element list, or an empty string if the student did not make
+        any choice '''
+        return {studentid: ([answerletters[code]] if code else "")
+                for studentid, code in zip(self.students, answers)}
+
+    def answerOf(self, answers, studentid):
+        ''' Letter chosen by a student, empty if the student did not make any
+        choice or is not in the roster '''
+        index=self.studentindex.get(studentid)
+        if index is None:
+            return ''
+        return answerletters[answers[index]]
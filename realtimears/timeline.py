@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Timeline of the votes of each question: answer changes and response times
+"""
+
+import bisect
+
+from .session import refreshSession
+from .tally import answercodes, getTallyIndex
+from .timing import timed, timer
+
+
+# Upper edges in seconds of the response time histogram buckets, the last
+# bucket holds everything slower
+responseedges=[5, 10, 15, 20, 30, 45, 60, 90, 120]
+
+
+class QuestionTimeline():
+    ''' Votes of one question as events ordered by the time the base recorded
+    for them (the tm attribute of each <v>). update takes the pollanswers of
+    the question as many times as wanted while the poll is open and only
+    processes the votes added since the previous call, so the cost of an
+    update depends on the new votes and not on the size of the block.
+    Each vote is resolved as it arrives: the latest vote of a clicker wins,
+    a vote older than the one already kept (out of order in the file) does
+    not change the answer. The answer codes are the same as those of
+    TallyIndex.tally, and for every student the time of the first vote and
+    the number of times the answer changed are kept, with the first vote
+    times in a sorted list for the response time distribution '''
+
+    def __init__(self, tallyindex):
+        self.tallyindex=tallyindex
+        self.reset()
+
+    def reset(self):
+        nstudents=len(self.tallyindex.students)
+        self.answers=bytearray(nstudents)
+        self.firsttime=[None]*nstudents
+        self.lasttime=[None]*nstudents
+        self.changes=[0]*nstudents
+        # Latest answer and its time of each unregistered iClicker ID
+        self.unregistered={}
+        # (seconds, order of arrival, iClicker ID, answer) of every vote
+        self.events=[]
+        # Sorted first vote times of the students that voted
+        self.responsetimes=[]
+        self.totalchanges=0
+        self.changers=0
+        # Latest time seen, used for votes without a time
+        self.clock=0
+        # Whether any vote had a time, response times mean nothing otherwise
+        self.timed=False
+        self.lastvote=None
+
+    def update(self, pollanswers):
+        ''' Take the votes in pollanswers not seen yet, returns how many.
+        If the votes seen before are not at the start of pollanswers any
+        more the block was replaced and is read again from the start '''
+        studentid=pollanswers[0]
+        answerchoice=pollanswers[1]
+        votetime=pollanswers[2] if len(pollanswers)>2 else None
+        seen=len(self.events)
+        if seen and (len(studentid)<seen or self.lastvote!=
+                     (studentid[seen-1], answerchoice[seen-1])):
+            self.reset()
+            seen=0
+        for i in range(seen, len(studentid)):
+            self.vote(studentid[i], answerchoice[i],
+                      votetime[i] if votetime else None)
+        if len(studentid)>seen:
+            self.lastvote=(studentid[-1], answerchoice[-1])
+        return len(studentid)-seen
+
+    def vote(self, iclickerid, answer, seconds):
+        ''' Resolve one vote '''
+        if seconds is None:
+            seconds=self.clock
+        else:
+            self.timed=True
+            if seconds>self.clock:
+                self.clock=seconds
+        event=(seconds, len(self.events), iclickerid, answer)
+        if not self.events or event>self.events[-1]:
+            self.events.append(event)
+        else:
+            bisect.insort(self.events, event)
+        index=self.tallyindex.clickerindex.get(iclickerid)
+        if index is None:
+            kept=self.unregistered.get(iclickerid)
+            if kept is None or seconds>=kept[1]:
+                self.unregistered[iclickerid]=(answer, seconds)
+            return
+        code=answercodes.get(answer, 0)
+        last=self.lasttime[index]
+        if last is None:
+            self.answers[index]=code
+            self.firsttime[index]=seconds
+            self.lasttime[index]=seconds
+            bisect.insort(self.responsetimes, seconds)
+            return
+        if seconds>=last:
+            if code!=self.answers[index]:
+                if self.changes[index]==0:
+                    self.changers+=1
+                self.changes[index]+=1
+                self.totalchanges+=1
+                self.answers[index]=code
+            self.lasttime[index]=seconds
+        if seconds<self.firsttime[index]:
+            # A late arriving first vote, move its response time
+            del self.responsetimes[bisect.bisect_left(
+                    self.responsetimes, self.firsttime[index])]
+            bisect.insort(self.responsetimes, seconds)
+            self.firsttime[index]=seconds
+
+    def answersAt(self, seconds):
+        ''' Answer codes as they were at the given second of the poll,
+        replaying the events up to it '''
+        answers=bytearray(len(self.answers))
+        clickerindex=self.tallyindex.clickerindex
+        for event in self.events:
+            if event[0]>seconds:
+                break
+            index=clickerindex.get(event[2])
+            if index is not None:
+                answers[index]=answercodes.get(event[3], 0)
+        return answers
+
+    def voters(self):
+        ''' Number of registered students that voted '''
+        return len(self.responsetimes)
+
+    def responsePercentile(self, fraction):
+        ''' First vote time below which the given fraction of the students
+        that voted answered, None if nobody voted or the votes have no time
+        '''
+        if not self.responsetimes or not self.timed:
+            return None
+        position=min(int(len(self.responsetimes)*fraction),
+                     len(self.responsetimes)-1)
+        return self.responsetimes[position]
+
+    def responseHistogram(self, edges=responseedges):
+        ''' Number of students whose first vote came within each bucket of
+        edges, plus the ones slower than the last edge '''
+        counts=[]
+        below=0
+        for edge in edges:
+            upto=bisect.bisect_right(self.responsetimes, edge)
+            counts.append(upto-below)
+            below=upto
+        counts.append(len(self.responsetimes)-below)
+        return counts
+
+    def summary(self):
+        ''' Dictionary with the votes, voters, students that changed their
+        answer, total changes, median and 90th percentile response times and
+        unregistered clickers of the question '''
+        return {'votes': len(self.events), 'voters': self.voters(),
+                'changers': self.changers, 'changes': self.totalchanges,
+                'median': self.responsePercentile(0.5),
+                'p90': self.responsePercentile(0.9),
+                'unregistered': len(self.unregistered)}
+
+
+class VoteTimeline():
+    ''' QuestionTimeline of every question of a session. update takes the
+    blocks of a SessionTailReader (or sessionBlocks) and brings up to date
+    only the last question seen and the new ones '''
+
+    def __init__(self, iclickerdict):
+        self.iclickerdict=iclickerdict
+        self.questions=[]
+
+    @timed('timeline')
+    def update(self, blocks):
+        ''' Take the new votes in blocks, returns the QuestionTimeline of the
+        latest question or None if there are no blocks '''
+        if len(blocks)<len(self.questions):
+            # The session file was replaced
+            self.questions=[]
+        tallyindex=getTallyIndex(self.iclickerdict)
+        for number in range(max(len(self.questions)-1, 0), len(blocks)):
+            if number==len(self.questions):
+                self.questions.append(QuestionTimeline(tallyindex))
+            self.questions[number].update(blocks[number])
+        return self.questions[-1] if self.questions else None
+
+    def answersOf(self, first, last):
+        ''' List of [number, copy of the answer codes] of the questions
+        first to last, numbered from 1 '''
+        return [[number, bytearray(self.questions[number-1].answers)]
+                for number in range(max(first, 1),
+                                    min(last, len(self.questions))+1)]
+
+
+def tallyTimeline(sessionfile, iclickerdict, votetimeline):
+    ''' Reads the new answers in the xml file and brings votetimeline up to
+    date with them. Returns the same as tallyLatest, with the answers of the
+    latest question taken from its QuestionTimeline so only the new votes
+    are tallied, plus the summary of that question. The answers and summary
+    are copies that later updates won't touch '''
+    blocks=refreshSession(sessionfile)
+    if len(blocks)==0 or len(blocks[0][0])==0:
+        raise ValueError(sessionfile + ' has no answers')
+    latest=votetimeline.update(blocks)
+    with timer('tally'):
+        tallyindex=getTallyIndex(iclickerdict)
+        answers=bytearray(latest.answers)
+        unregistered={iclickerid: answer for iclickerid, (answer, seconds)
+                      in latest.unregistered.items()}
+        organizedresults=tallyindex.organize(answers, unregistered)
+    return (len(blocks), answers, organizedresults, unregistered,
+            latest.summary())
+
+
+def describeTimeline(summary):
+    ''' Short text with the answer changes and median response time of a
+    question from its QuestionTimeline.summary, for the status line of the
+    results window '''
+    text=str(summary['changers']) + ' changed answer'
+    if summary['median'] is not None:
+        text+=', median response ' + str(summary['median']) + ' s'
+    return text
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Timing of the stages between a change in the session file and the results
+on screen
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+# Timing is off unless REALTIMEARS_TIMING=1 or enable() is called, when off
+# a timed function costs one extra call and a flag check
+enabled=os.environ.get('REALTIMEARS_TIMING', '0')=='1'
+# Milliseconds within which results should be on screen after a poll
+# changes, None for no target
+target=None
+# Upper edges in milliseconds of the histogram buckets, the last bucket
+# holds everything slower
+bucketedges=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+# Stage of the end to end latency, from the first write in a burst of
+# writes to the session file to the results window updated
+endtoend='change to screen'
+
+
+def enable(flag=True):
+    ''' Turn timing on or off '''
+    global enabled
+    enabled=flag
+
+
+def setTarget(milliseconds):
+    ''' Set the end to end latency target, None to remove it '''
+    global target
+    target=milliseconds
+
+
+class StageTimes():
+    ''' Rolling record of the last window durations of a stage, in
+    milliseconds, plus the total number of durations recorded and, for the
+    end to end stage, how many of them were over the latency target '''
+
+    def __init__(self, stage, window=1000):
+        self.stage=stage
+        self.durations=deque(maxlen=window)
+        self.count=0
+        self.overtarget=0
+
+    def record(self, milliseconds):
+        self.durations.append(milliseconds)
+        self.count+=1
+        if (self.stage==endtoend and target is not None and
+                milliseconds>target):
+            self.overtarget+=1
+
+    def summary(self):
+        ''' Dictionary with the count, mean, median, 95th percentile and
+        maximum of the window, and its histogram as a list of counts per
+        bucket of bucketedges '''
+        durations=sorted(self.durations)
+        histogram=[0]*(len(bucketedges)+1)
+        for duration in durations:
+            for bucket, edge in enumerate(bucketedges):
+                if duration<=edge:
+                    break
+            else:
+                bucket=len(bucketedges)
+            histogram[bucket]+=1
+        summary={'count': self.count, 'overtarget': self.overtarget,
+                 'histogram': histogram}
+        if durations:
+            summary.update(mean=sum(durations)/len(durations),
+                           median=durations[len(durations)//2],
+                           p95=durations[int(len(durations)*0.95)],
+                           max=durations[-1])
+        return summary
+
+
+# StageTimes of each stage by name
+stagetimes={}
+lock=threading.Lock()
+
+
+def record(stage, milliseconds):
+    ''' Record a duration of a stage, from any thread '''
+    with lock:
+        times=stagetimes.get(stage)
+        if times is None:
+            times=stagetimes[stage]=StageTimes(stage)
+        times.record(milliseconds)
+
+
+class timer():
+    ''' Context manager that records the time spent in the block as a
+    duration of stage, if timing is enabled '''
+
+    def __init__(self, stage):
+        self.stage=stage
+
+    def __enter__(self):
+        self.start=time.perf_counter() if enabled else None
+        return self
+
+    def __exit__(self, *exception):
+        if self.start is not None:
+            record(self.stage, (time.perf_counter()-self.start)*1000)
+        return False
+
+
+def timed(stage):
+    ''' Decorator that records the time spent in each call to the function
+    as a duration of stage, if timing is enabled '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start=time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(stage, (time.perf_counter()-start)*1000)
+        return wrapper
+    return decorator
+
+
+def summaries():
+    ''' Dictionary of stage name and StageTimes.summary '''
+    with lock:
+        return {stage: times.summary() for stage, times in
+                sorted(stagetimes.items())}
+
+
+def exportJson(filename):
+    ''' Saves the summaries of every stage, the bucket edges and the target
+    in a JSON file '''
+    with open(filename, 'w') as outjson:
+        json.dump({'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'target': target, 'bucketedges': bucketedges,
+                   'stages': summaries()}, outjson, indent=1)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Watching of the session file for changes
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+
+class SessionWatcher():
+    ''' Watches the session file from a background thread and puts a token
+    in the changes queue after each burst of writes. The base writes a poll
+    in several steps, so a change is reported only once the file has been
+    quiet for debounce seconds, or after maxdelay seconds of continuous writes
+    so answers keep coming in while a poll is open. Uses inotify on Linux and
+    falls back to checking the size and modification time of the file every
+    interval seconds on other systems. The token is the time.monotonic()
+    of the first write in the burst, to measure the latency from there '''
+
+    # inotify event masks, from <sys/inotify.h>
+    IN_MODIFY=0x00000002
+    IN_CLOSE_WRITE=0x00000008
+    IN_MOVED_TO=0x00000080
+    IN_CREATE=0x00000100
+
+    def __init__(self, sessionfile, changes, debounce=0.3, maxdelay=2.0,
+                 interval=0.5):
+        self.sessionfile=os.path.abspath(sessionfile)
+        self.changes=changes
+        self.debounce=debounce
+        self.maxdelay=maxdelay
+        self.interval=interval
+        self.stopped=threading.Event()
+        self.thread=threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        fd=self.inotifyInit()
+        if fd is None:
+            self.watch(self.pollWait)
+            return
+        try:
+            self.watch(lambda timeout: self.inotifyWait(fd, timeout))
+        finally:
+            os.close(fd)
+
+    def watch(self, wait):
+        ''' Main loop of the watcher. wait(timeout) blocks for at most timeout
+        seconds and returns True if the file changed in the meantime '''
+        while not self.stopped.is_set():
+            if not wait(0.2):
+                continue
+            # Debounce: wait until the writes stop or maxdelay is reached
+            first=time.monotonic()
+            while not self.stopped.is_set():
+                remaining=self.maxdelay-(time.monotonic()-first)
+                if remaining<=0 or not wait(min(self.debounce, remaining)):
+                    break
+            self.changes.put(first)
+
+    def pollWait(self, timeout):
+        ''' Fallback wait: compare size and modification time of the file
+        every interval seconds '''
+        if not hasattr(self, 'laststat'):
+            self.laststat=self.fileStat()
+        deadline=time.monotonic()+timeout
+        while True:
+            current=self.fileStat()
+            if current!=self.laststat:
+                self.laststat=current
+                return True
+            remaining=deadline-time.monotonic()
+            if remaining<=0 or self.stopped.wait(min(self.interval,
+                                                     remaining)):
+                return False
+
+    def fileStat(self):
+        try:
+            stat=os.stat(self.sessionfile)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def inotifyInit(self):
+        ''' Set up an inotify watch on the directory of the session file, so
+        the file being replaced is also noticed. Returns the inotify file
+        descriptor or None if inotify is not available '''
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc=ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd=libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd<0:
+            return None
+        mask=(self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO |
+              self.IN_CREATE)
+        directory=os.path.dirname(self.sessionfile)
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask)<0:
+            os.close(fd)
+            return None
+        self.filename=os.fsencode(os.path.basename(self.sessionfile))
+        return fd
+
+    def inotifyWait(self, fd, timeout):
+        ''' Wait for inotify events about the session file '''
+        ready, _, _=select.select([fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data=os.read(fd, 65536)
+        except BlockingIOError:
+            return False
+        # Each event is struct inotify_event followed by a name of len bytes
+        changed=False
+        position=0
+        while position<len(data):
+            _, _, _, length=struct.unpack_from('iIII', data, position)
+            position+=16
+            name=data[position:position+length].rstrip(b'\0')
+            position+=length
+            if name==self.filename:
+                changed=True
+        return changed
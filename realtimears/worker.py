@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Background worker that reads and tallies files away from the Tk main loop
+"""
+
+import itertools
+import queue
+import threading
+import traceback
+
+
+class TallyWorker():
+    ''' Background thread that reads and tallies session files away from the
+    Tk main loop. Jobs are submitted on a channel (the session file name) and
+    each submission makes the previous jobs on the same channel stale: stale
+    jobs still waiting are skipped and stale results are dropped. Results are
+    put in a queue and drain, called from the main loop with root.after, runs
+    the callback (or errback if the job raised an error) of current jobs '''
+
+    def __init__(self):
+        self.jobs=queue.Queue()
+        self.results=queue.Queue()
+        # Latest generation submitted on each channel
+        self.latest={}
+        self.generations=itertools.count(1)
+        self.lock=threading.Lock()
+        self.thread=threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, channel, function, args, callback, errback=None):
+        ''' Run function(*args) in the worker and later callback(result) in
+        the main loop, unless a newer job is submitted on the channel '''
+        with self.lock:
+            generation=next(self.generations)
+            self.latest[channel]=generation
+        self.jobs.put((channel, generation, function, args, callback,
+                       errback))
+
+    def cancel(self, channel):
+        ''' Make every job on the channel stale '''
+        with self.lock:
+            self.latest[channel]=next(self.generations)
+
+    def isCurrent(self, channel, generation):
+        with self.lock:
+            return self.latest.get(channel)==generation
+
+    def run(self):
+        while True:
+            channel, generation, function, args, callback, errback=\
+                    self.jobs.get()
+            if not self.isCurrent(channel, generation):
+                continue
+            try:
+                result=function(*args)
+                self.results.put((channel, generation, callback, result))
+            except Exception as error:
+                self.results.put((channel, generation, errback, error))
+
+    def drain(self, onerror=None):
+        ''' Hand the results of current jobs to their callbacks, must be
+        called from the main loop. A callback that raises does not stop the
+        others: the error is passed to onerror, or printed if there is none '''
+        while True:
+            try:
+                channel, generation, callback, result=self.results.get_nowait()
+            except queue.Empty:
+                return
+            if callback is None or not self.isCurrent(channel, generation):
+                continue
+            try:
+                callback(result)
+            except Exception as error:
+                if onerror is None:
+                    traceback.print_exc()
+                else:
+                    onerror(error)
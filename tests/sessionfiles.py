@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Session XML files for the tests, written from lists of votes given as
+(iClicker ID, answer, seconds) with seconds None for a vote without time
+"""
+
+import random
+
+
+def voteXml(iclickerid, answer, seconds=None):
+    ''' Text of one <v> element, with a tm attribute if seconds is given '''
+    text='<v id="' + iclickerid + '" ans="' + answer + '"'
+    if seconds is not None:
+        text+=' tm="00:%02d:%02d"' % (seconds // 60, seconds % 60)
+    return text + ' />'
+
+
+def blockXml(votes, number=1):
+    ''' Text of one <p>...</p> block with the (iClicker ID, answer, seconds)
+    votes given '''
+    return ('<p idx="' + str(number) + '">\n' +
+            ''.join(voteXml(*vote) + '\n' for vote in votes) + '</p>\n')
+
+
+def sessionXml(blocks):
+    ''' Text of a session file with the given lists of votes as blocks '''
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<ssn ssnn="Test">\n' +
+            ''.join(blockXml(votes, number+1)
+                    for number, votes in enumerate(blocks)) + '</ssn>\n')
+
+
+def randomVotes(iclickerids, nvotes, untimed=0.2):
+    ''' nvotes random votes from iclickerids in random time order, a
+    fraction untimed of them without a time and some not A-E '''
+    return [(random.choice(iclickerids), random.choice('ABCDEX'),
+             None if random.random()<untimed else random.randint(0, 120))
+            for _ in range(nvotes)]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the semester database
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+
+from sessionfiles import sessionXml
+
+
+class SemesterStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(7)
+        self.tempdir=tempfile.TemporaryDirectory()
+        self.store=realtimears.SemesterStore(os.path.join(self.tempdir.name,
+                                                          'semester.sqlite'))
+        self.students=['S%02d' % i for i in range(12)]
+        # Answers of each session as ingested, to count participation
+        self.sessions={}
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def ingest(self, name, date, nquestions, filekey):
+        questions=[bytearray(random.choice([0, 0, 1, 2, 3, 4, 5])
+                             for _ in self.students)
+                   for _ in range(nquestions)]
+        added=self.store.ingest(name, date, questions, self.students,
+                                filekey)
+        if added:
+            self.sessions[name]=(date, questions)
+        return added
+
+    def expectedParticipation(self, start='', end='9999'):
+        ''' [student, answered, asked, rate] counted from the answers '''
+        rows=[]
+        for index, studentid in enumerate(self.students):
+            answered=0
+            asked=0
+            for date, questions in self.sessions.values():
+                if start<=date[:10]<=end:
+                    asked+=len(questions)
+                    answered+=sum(1 for answers in questions if answers[index])
+            rows.append([studentid, answered, asked,
+                         answered/asked if asked else 0])
+        rows.sort(key=lambda row: (row[3], row[0]))
+        return rows
+
+    def testParticipation(self):
+        self.ingest('L1609051030', '2016-09-05 10:30', 4, (100, 1))
+        self.ingest('L1609071030', '2016-09-07 10:30', 6, (200, 1))
+        self.ingest('L1610031030', '2016-10-03 10:30', 3, (300, 1))
+        self.assertEqual(self.store.participation(),
+                         self.expectedParticipation())
+        self.assertEqual(self.store.participation('2016-09-01', '2016-09-30'),
+                         self.expectedParticipation('2016-09-01',
+                                                    '2016-09-30'))
+
+    def testUnchangedSessionSkipped(self):
+        self.assertTrue(self.ingest('L1609051030', '2016-09-05 10:30', 4,
+                                    (100, 1)))
+        self.assertFalse(self.ingest('L1609051030', '2016-09-05 10:30', 4,
+                                     (100, 1)))
+        self.assertEqual(self.store.participation(),
+                         self.expectedParticipation())
+
+    def testUnchangedFileNotRead(self):
+        realtimears.parsecache.enabled=False
+        sessionfile=os.path.join(self.tempdir.name, 'L1609051030.xml')
+        with open(sessionfile, 'w') as xmlfile:
+            xmlfile.write(sessionXml([[('#01', 'A', 5), ('#02', 'B', 7)]]))
+        iclickerdict={'#01': 'S00', '#02': 'S01'}
+        self.assertTrue(realtimears.ingestSessionFile(self.store, sessionfile,
+                                                      iclickerdict))
+        with mock.patch('realtimears.analytics.batchSession') as batch:
+            self.assertFalse(realtimears.ingestSessionFile(
+                    self.store, sessionfile, iclickerdict))
+        batch.assert_not_called()
+        self.assertEqual(self.store.history('S01'), [['L1609051030', ['B']]])
+
+    def testChangedSessionReplaced(self):
+        self.ingest('L1609051030', '2016-09-05 10:30', 4, (100, 1))
+        self.ingest('L1609071030', '2016-09-07 10:30', 6, (200, 1))
+        self.store.setAnswerKey('L1609071030', 1, 'A')
+        # The file of the second session changed and has fewer questions
+        self.assertTrue(self.ingest('L1609071030', '2016-09-07 10:30', 2,
+                                    (150, 2)))
+        self.assertEqual(self.store.participation(),
+                         self.expectedParticipation())
+        self.assertEqual([row[2] for row in self.store.sessions()], [4, 2])
+        self.assertEqual(self.store.answerKeys(), {})
+        distributions=self.store.distributions()
+        self.assertEqual(len(distributions), 6)
+        for name, number, *counts in distributions:
+            answers=self.sessions[name][1][number-1]
+            self.assertEqual(counts, [answers.count(code)
+                                      for code in (1, 2, 3, 4, 5, 0)])
+
+    def testHistory(self):
+        self.ingest('L1609071030', '2016-09-07 10:30', 2, (200, 1))
+        self.ingest('L1609051030', '2016-09-05 10:30', 3, (100, 1))
+        history=self.store.history('S03')
+        self.assertEqual([name for name, letters in history],
+                         ['L1609051030', 'L1609071030'])
+        self.assertEqual(history[0][1],
+                         [realtimears.tally.answerletters[answers[3]]
+                          for answers in self.sessions['L1609051030'][1]])
+
+
+if __name__=='__main__':
+    unittest.main()
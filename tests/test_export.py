@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the write ahead SessionLog and of saving a session from it
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+from realtimears.cli import main
+from realtimears.tally import answercodes
+
+
+class SessionLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir=tempfile.TemporaryDirectory()
+        self.logfile=os.path.join(self.tempdir.name, 'session.log')
+        self.iclickerdict={'#01': 'S1', '#02': 'S2', '#03': 'S3'}
+        self.studentlist=['S1', 'S2', 'S3']
+        self.tallyindex=realtimears.getTallyIndex(self.iclickerdict)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def codes(self, letters):
+        ''' Answer codes of the students in order, a space for no choice '''
+        return bytearray(answercodes.get(letter, 0)
+                         for letter in letters.ljust(len(self.studentlist)))
+
+    def readCsv(self, namecsvfile):
+        with open(namecsvfile, newline='') as incsv:
+            return list(csv.reader(incsv))
+
+    def writeLog(self):
+        log=realtimears.SessionLog(self.logfile, self.studentlist)
+        log.append(1, self.codes('AB'), self.tallyindex)
+        # Question 1 got more votes, the last row wins
+        log.append(1, self.codes('ABC'), self.tallyindex)
+        log.append(2, self.codes('D E'), self.tallyindex)
+        log.close()
+
+    def testRecover(self):
+        self.writeLog()
+        # A crash in the middle of writing a row
+        with open(self.logfile, 'a') as logcsv:
+            logcsv.write('3,A,')
+        output=os.path.join(self.tempdir.name, 'recovered.csv')
+        self.assertEqual(main(['recover', self.logfile, '-o', output]), 0)
+        self.assertEqual(self.readCsv(output),
+                         [['Student/Team', 'Question 1', 'Question 2'],
+                          ['S1', 'A', 'D'], ['S2', 'B', ''],
+                          ['S3', 'C', 'E']])
+
+    def testMissingQuestionsKeepTheirColumns(self):
+        log=realtimears.SessionLog(self.logfile, self.studentlist)
+        log.append(1, self.codes('A'), self.tallyindex)
+        log.append(2, self.codes(' B'), self.tallyindex)
+        log.append(5, self.codes('  C'), self.tallyindex)
+        output=os.path.join(self.tempdir.name, 'session.csv')
+        log.materialize(output)
+        log.close()
+        self.assertEqual(self.readCsv(output),
+                         [['Student/Team']+['Question %d' % number
+                                            for number in range(1, 6)],
+                          ['S1', 'A', '', '', '', ''],
+                          ['S2', '', 'B', '', '', ''],
+                          ['S3', '', '', '', '', 'C']])
+
+    def testMaterializeMatchesMakeSessionCsv(self):
+        self.writeLog()
+        log=realtimears.SessionLog(self.logfile, self.studentlist)
+        fromlog=os.path.join(self.tempdir.name, 'fromlog.csv')
+        log.materialize(fromlog)
+        log.close()
+        questions=[self.codes('ABC'), self.codes('D E')]
+        direct=os.path.join(self.tempdir.name, 'direct.csv')
+        realtimears.makeSessionCsv(direct, realtimears.sessionResults(
+                self.iclickerdict, self.studentlist, questions),
+                self.studentlist)
+        self.assertEqual(self.readCsv(fromlog), self.readCsv(direct))
+
+    def testUnchangedAnswersNotLogged(self):
+        log=realtimears.SessionLog(self.logfile, self.studentlist)
+        for _ in range(3):
+            log.append(1, self.codes('AB'), self.tallyindex)
+        log.close()
+        self.assertEqual(len(self.readCsv(self.logfile)), 2)
+
+    def testOtherRosterKeepsOldLog(self):
+        self.writeLog()
+        log=realtimears.SessionLog(self.logfile, ['S1', 'S2'])
+        log.close()
+        self.assertTrue(os.path.exists(self.logfile + '.old'))
+        studentlist, questions=realtimears.readSessionLog(self.logfile)
+        self.assertEqual((studentlist, questions), (['S1', 'S2'], []))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the incremental reading of session files by SessionTailReader
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+from realtimears.session import SessionTailReader, sessionreaders
+
+from sessionfiles import blockXml, sessionXml
+
+
+class SessionTailReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        realtimears.parsecache.enabled=False
+        self.tempdir=tempfile.TemporaryDirectory()
+        self.sessionfile=os.path.join(self.tempdir.name, 'L1609051030.xml')
+        self.first=[('#01', 'A', 5), ('#02', 'B', 7)]
+        self.write(sessionXml([self.first]))
+        self.reader=SessionTailReader(self.sessionfile)
+
+    def tearDown(self):
+        sessionreaders.clear()
+        self.tempdir.cleanup()
+
+    def write(self, text):
+        with open(self.sessionfile, 'w') as xmlfile:
+            xmlfile.write(text)
+
+    def appendBlock(self, votes, number):
+        ''' Add a block the way the base does, rewriting the closing tag of
+        the root element '''
+        with open(self.sessionfile, 'r+') as xmlfile:
+            text=xmlfile.read()
+            xmlfile.seek(text.rindex('</ssn>'))
+            xmlfile.write(blockXml(votes, number) + '</ssn>\n')
+            xmlfile.truncate()
+
+    def assertBlocks(self, blocks, expected):
+        self.assertEqual([[list(column) for column in block]
+                          for block in blocks],
+                         [[[vote[0] for vote in votes],
+                           [vote[1] for vote in votes],
+                           [vote[2] for vote in votes]]
+                          for votes in expected])
+
+    def testFirstRead(self):
+        self.assertBlocks(self.reader.refresh(), [self.first])
+
+    def testAppendedBlock(self):
+        self.reader.refresh()
+        second=[('#01', 'C', 3), ('#03', 'D', None)]
+        self.appendBlock(second, 2)
+        self.assertBlocks(self.reader.refresh(), [self.first, second])
+
+    def testVotesAddedToLastBlock(self):
+        self.reader.refresh()
+        more=self.first+[('#03', 'E', 9)]
+        self.write(sessionXml([more]))
+        self.assertBlocks(self.reader.refresh(), [more])
+
+    def testHalfWrittenBlock(self):
+        self.reader.refresh()
+        second=[('#01', 'C', 3), ('#02', 'D', 4)]
+        self.appendBlock(second, 2)
+        # Cut the file in the middle of the second block
+        with open(self.sessionfile, 'r+') as xmlfile:
+            text=xmlfile.read()
+            xmlfile.seek(0)
+            xmlfile.write(text[:text.index('#02', text.index('idx="2"'))])
+            xmlfile.truncate()
+        self.assertBlocks(self.reader.refresh(), [self.first])
+        # The base finishes writing it
+        self.write(sessionXml([self.first, second]))
+        self.assertBlocks(self.reader.refresh(), [self.first, second])
+
+    def testFileReplaced(self):
+        self.reader.refresh()
+        self.appendBlock([('#01', 'C', 3)], 2)
+        self.reader.refresh()
+        other=[('#09', 'E', 1)]
+        self.write('<?xml version="1.0"?>\n<ssn ssnn="Other">\n' +
+                   blockXml(other) + '</ssn>\n')
+        self.assertBlocks(self.reader.refresh(), [other])
+
+    def testSeededFromCache(self):
+        blocks=realtimears.sessionBlocks(self.sessionfile)
+        self.assertTrue(self.reader.seed(blocks))
+        second=[('#02', 'A', 2)]
+        self.appendBlock(second, 2)
+        self.assertBlocks(self.reader.refresh(), [self.first, second])
+
+    def testGetPollResultsPair(self):
+        self.appendBlock([('#01', 'C', 3), ('#02', 'D', None)], 2)
+        studentid, answerchoice=realtimears.getPollResults(self.sessionfile)
+        self.assertEqual(studentid, ['#01', '#02'])
+        self.assertEqual(answerchoice, ['C', 'D'])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that the tallies of the live, batch, timeline and packed paths agree
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import realtimears
+from realtimears.session import sessionreaders
+from realtimears.tally import answerletters
+
+from sessionfiles import randomVotes, sessionXml
+
+
+class TallyAgreementTest(unittest.TestCase):
+
+    def setUp(self):
+        realtimears.parsecache.enabled=False
+        self.tempdir=tempfile.TemporaryDirectory()
+        self.sessionfile=os.path.join(self.tempdir.name, 'session.xml')
+        # Some clickers vote without being in the roster
+        self.iclickerids=['#%06X' % i for i in range(40)]
+        self.iclickerdict={iclickerid: 'Student ' + iclickerid[1:]
+                           for iclickerid in self.iclickerids[:32]}
+        self.tallyindex=realtimears.getTallyIndex(self.iclickerdict)
+
+    def tearDown(self):
+        sessionreaders.clear()
+        self.tempdir.cleanup()
+
+    def writeSession(self, blocks):
+        with open(self.sessionfile, 'w') as xmlfile:
+            xmlfile.write(sessionXml(blocks))
+
+    def tallies(self):
+        ''' Answer codes of every question by TallyIndex.tally (through
+        batchSession), QuestionTimeline and PackedSession.tally '''
+        batch=realtimears.batchSession(self.sessionfile, self.iclickerdict)
+        votetimeline=realtimears.VoteTimeline(self.iclickerdict)
+        votetimeline.update(realtimears.sessionBlocks(self.sessionfile))
+        timeline=[question.answers for question in votetimeline.questions]
+        packedfile=realtimears.packSession(self.sessionfile)
+        with realtimears.PackedSession(packedfile) as packed:
+            packedtally=[packed.tally(number+1, self.tallyindex)
+                         for number in range(len(packed))]
+        return batch, timeline, packedtally
+
+    def testLatestVoteByTimeWins(self):
+        # The later vote in the file was cast earlier
+        self.writeSession([[('#000001', 'A', 30), ('#000001', 'B', 10),
+                            ('#000027', 'C', 20), ('#000027', 'D', 5)]])
+        index=self.tallyindex.clickerindex['#000001']
+        for answers in self.tallies():
+            self.assertEqual(answerletters[answers[0][index]], 'A')
+        number, answers, organizedresults, unregistered=\
+                realtimears.tallyLatest(self.sessionfile, self.iclickerdict)
+        self.assertEqual(answerletters[answers[index]], 'A')
+        self.assertEqual(unregistered, {'#000027': 'C'})
+
+    def testWithoutTimesLastVoteWins(self):
+        self.writeSession([[('#000001', 'A', None), ('#000001', 'B', None)]])
+        index=self.tallyindex.clickerindex['#000001']
+        for answers in self.tallies():
+            self.assertEqual(answerletters[answers[0][index]], 'B')
+
+    def testRandomSessionsAgree(self):
+        random.seed(5)
+        blocks=[randomVotes(self.iclickerids, 120) for _ in range(12)]
+        self.writeSession(blocks)
+        batch, timeline, packedtally=self.tallies()
+        self.assertEqual(batch, timeline)
+        self.assertEqual(batch, packedtally)
+        # The live path and the history of a student say the same
+        votetimeline=realtimears.VoteTimeline(self.iclickerdict)
+        tallied=realtimears.tallyTimeline(self.sessionfile,
+                                          self.iclickerdict, votetimeline)
+        self.assertEqual(tallied[1], batch[-1])
+        self.assertEqual(tallied[1], realtimears.tallyLatest(
+                self.sessionfile, self.iclickerdict)[1])
+        packedfile=realtimears.packedSessionFile(self.sessionfile)
+        with realtimears.PackedSession(packedfile) as packed:
+            for iclickerid in self.iclickerids[:32]:
+                index=self.tallyindex.clickerindex[iclickerid]
+                self.assertEqual(packed.history([iclickerid]),
+                                 [answerletters[answers[index]]
+                                  for answers in batch])
+
+    def testIncrementalTimelineAgrees(self):
+        random.seed(6)
+        votes=randomVotes(self.iclickerids, 200)
+        votetimeline=realtimears.VoteTimeline(self.iclickerdict)
+        # The votes arrive a few at a time while the poll is open
+        for end in range(10, len(votes)+1, 10):
+            self.writeSession([votes[:end]])
+            tallied=realtimears.tallyTimeline(self.sessionfile,
+                                              self.iclickerdict, votetimeline)
+            self.assertEqual(tallied[1], self.tallyindex.tally(
+                    realtimears.sessionBlocks(self.sessionfile)[0]))
+
+    def testAggregatorMergesStationsByTime(self):
+        from realtimears.ingest import VoteAggregator
+        random.seed(8)
+        # Every clicker may vote in both rooms
+        rooms=[randomVotes(self.iclickerids, 80) for _ in range(2)]
+        aggregator=VoteAggregator(self.iclickerdict)
+        for name, votes in zip(['room 2', 'room 1'], rooms):
+            aggregator.update(name, 1, [[vote[0] for vote in votes],
+                                        [vote[1] for vote in votes],
+                                        [vote[2] for vote in votes]])
+        # The same votes in one session file, merged by time
+        merged=aggregator.merged(1)
+        self.writeSession([list(zip(*merged))])
+        number, answers, organizedresults, unregistered=aggregator.tally(1)
+        self.assertEqual((number, answers, organizedresults, unregistered),
+                         realtimears.tallyLatest(self.sessionfile,
+                                                 self.iclickerdict))
+        self.assertEqual(merged[2], sorted(merged[2]))
+        # A later vote in the room sorted first wins over an earlier one
+        aggregator.update('room 1', 2, [['#000001'], ['A'], [40]])
+        aggregator.update('room 2', 2, [['#000001'], ['B'], [10]])
+        index=self.tallyindex.clickerindex['#000001']
+        self.assertEqual(answerletters[aggregator.tally(2)[1][index]], 'A')
+
+
+if __name__=='__main__':
+    unittest.main()